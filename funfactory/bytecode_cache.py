@@ -0,0 +1,93 @@
+"""
+Jinja2 bytecode caches, so worker processes can share compiled templates
+instead of each compiling every template on startup.
+
+Turn one on with ``JINJA_BYTECODE_CACHE`` (see settings_base).
+"""
+from hashlib import sha1
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+import jinja2
+from jinja2 import bccache
+
+
+class VersionedKeyMixin(object):
+    """
+    Keys cache entries on the Jinja version and the template file's mtime as
+    well as its name, so a deploy or an upgrade never loads stale entries.
+    """
+
+    def get_cache_key(self, name, filename=None):
+        key = super(VersionedKeyMixin, self).get_cache_key(name, filename)
+        try:
+            mtime = os.path.getmtime(filename) if filename else 0
+        except OSError:
+            mtime = 0
+        return sha1('%s|%s|%r' % (jinja2.__version__, key, mtime)).hexdigest()
+
+
+class FileSystemBytecodeCache(VersionedKeyMixin,
+                              bccache.FileSystemBytecodeCache):
+    """
+    Stores bytecode in ``directory``, writing each entry to a temporary file
+    first so other processes never read a half-written one.
+
+    Loading bytecode runs it, so the directory must belong to the current
+    user and be writable by nobody else. Without one, a directory only the
+    current user can use is created in the system temp dir.
+    """
+
+    def __init__(self, directory=None, pattern='__jinja2_%s.cache'):
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(),
+                                     'funfactory-jinja2-%s' % os.getuid())
+        super(FileSystemBytecodeCache, self).__init__(directory, pattern)
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory, 0700)
+            except OSError:
+                # Somebody else just created it.
+                if not os.path.isdir(self.directory):
+                    raise
+        st = os.stat(self.directory)
+        if st.st_uid != os.getuid() or st.st_mode & 022:
+            raise ImproperlyConfigured(
+                'Jinja bytecode cache directory %s must be owned by the '
+                'current user and not writable by others.' % self.directory)
+
+    def dump_bytecode(self, bucket):
+        fd, tmp = tempfile.mkstemp(prefix='.', suffix='.tmp',
+                                   dir=self.directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                bucket.write_bytecode(f)
+            finally:
+                f.close()
+            os.rename(tmp, self._get_cache_filename(bucket))
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+class DjangoBytecodeCache(VersionedKeyMixin, bccache.BytecodeCache):
+    """Stores bytecode in one of the Django cache backends."""
+
+    def __init__(self, cache_alias='default', prefix='jinja2:bytecode:',
+                 timeout=None):
+        from django.core.cache import get_cache
+        self.cache = get_cache(cache_alias)
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def load_bytecode(self, bucket):
+        code = self.cache.get(self.prefix + bucket.key)
+        if code is not None:
+            bucket.bytecode_from_string(code)
+
+    def dump_bytecode(self, bucket):
+        self.cache.set(self.prefix + bucket.key, bucket.bytecode_to_string(),
+                       self.timeout)
@@ -6,10 +6,13 @@ Installs a skeleton Django app based on Mozilla's Playdoh.
 3. Creates a virtualenv
 4. Installs/compiles the requirements
 5. Creates a local settings file
+
+Steps run as soon as the ones they need are done, and steps that finished
+before are skipped, so an interrupted install can just be re-run.
 Read more about it here: http://playdoh.readthedocs.org/
 """
-from contextlib import contextmanager
 from datetime import datetime
+from hashlib import sha1
 import logging
 import optparse
 import os
@@ -17,7 +20,10 @@ import re
 import shutil
 import subprocess
 import sys
+import tempfile
 import textwrap
+import threading
+import time
 
 
 allow_user_input = True
@@ -27,7 +33,20 @@ log = logging.getLogger(__name__)
 
 def clone_repo(pkg, dest, repo, repo_dest, branch):
     """Clone the Playdoh repo into a custom path."""
-    git(['clone', '--recursive', '-b', branch, repo, repo_dest])
+    if os.path.exists(repo_dest) and os.listdir(repo_dest):
+        raise EnvironmentError('Cannot clone into %s, it is not empty'
+                               % repo_dest)
+    parent = os.path.dirname(os.path.abspath(repo_dest))
+    makedirs(parent)
+    # Clone next to repo_dest and rename, so a clone interrupted before all
+    # of its submodules are there is never mistaken for a finished one.
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        git(['clone', '--recursive', '-b', branch, repo, tmp])
+        os.rename(tmp, repo_dest)
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
 
 
 def init_pkg(pkg, repo_dest):
@@ -38,51 +57,51 @@ def init_pkg(pkg, repo_dest):
     name.
     """
     vars = {'pkg': pkg}
-    with dir_path(repo_dest):
-        patch("""\
-        diff --git a/manage.py b/manage.py
-        index 40ebb0a..cdfe363 100755
-        --- a/manage.py
-        +++ b/manage.py
-        @@ -3,7 +3,7 @@ import os
-         import sys
-
-         # Edit this if necessary or override the variable in your environment.
-        -os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
-        +os.environ.setdefault('DJANGO_SETTINGS_MODULE', '%(pkg)s.settings')
-
-         try:
-             # For local development in a virtualenv:
-        diff --git a/project/settings/base.py b/project/settings/base.py
-        index 312f280..c75e673 100644
-        --- a/project/settings/base.py
-        +++ b/project/settings/base.py
-        @@ -7,7 +7,7 @@ from funfactory.settings_base import *
-         # If you did not install Playdoh with the funfactory installer script
-         # you may need to edit this value. See the docs about installing from a
-         # clone.
-        -PROJECT_MODULE = 'project'
-        +PROJECT_MODULE = '%(pkg)s'
-
-         # Bundles is a dictionary of two dictionaries, css and js, which list css files
-         # and js files that can be bundled together by the minify app.
-        diff --git a/setup.py b/setup.py
-        index 58dbd93..9a38628 100644
-        --- a/setup.py
-        +++ b/setup.py
-        @@ -3,7 +3,7 @@ import os
-         from setuptools import setup, find_packages
-
-
-        -setup(name='project',
-        +setup(name='%(pkg)s',
-               version='1.0',
-               description='Django application.',
-               long_description='',
-        """ % vars)
-
-        git(['mv', 'project', pkg])
-        git(['commit', '-a', '-m', 'Renamed project module to %s' % pkg])
+    patch("""\
+    diff --git a/manage.py b/manage.py
+    index 40ebb0a..cdfe363 100755
+    --- a/manage.py
+    +++ b/manage.py
+    @@ -3,7 +3,7 @@ import os
+     import sys
+
+     # Edit this if necessary or override the variable in your environment.
+    -os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    +os.environ.setdefault('DJANGO_SETTINGS_MODULE', '%(pkg)s.settings')
+
+     try:
+         # For local development in a virtualenv:
+    diff --git a/project/settings/base.py b/project/settings/base.py
+    index 312f280..c75e673 100644
+    --- a/project/settings/base.py
+    +++ b/project/settings/base.py
+    @@ -7,7 +7,7 @@ from funfactory.settings_base import *
+     # If you did not install Playdoh with the funfactory installer script
+     # you may need to edit this value. See the docs about installing from a
+     # clone.
+    -PROJECT_MODULE = 'project'
+    +PROJECT_MODULE = '%(pkg)s'
+
+     # Bundles is a dictionary of two dictionaries, css and js, which list css files
+     # and js files that can be bundled together by the minify app.
+    diff --git a/setup.py b/setup.py
+    index 58dbd93..9a38628 100644
+    --- a/setup.py
+    +++ b/setup.py
+    @@ -3,7 +3,7 @@ import os
+     from setuptools import setup, find_packages
+
+
+    -setup(name='project',
+    +setup(name='%(pkg)s',
+           version='1.0',
+           description='Django application.',
+           long_description='',
+    """ % vars, cwd=repo_dest)
+
+    git(['mv', 'project', pkg], cwd=repo_dest)
+    git(['commit', '-a', '-m', 'Renamed project module to %s' % pkg],
+        cwd=repo_dest)
 
 
 def generate_key(byte_length):
@@ -116,63 +135,98 @@ def create_settings(pkg, repo_dest, db_user, db_name, db_password, db_host,
             'hmac_date': datetime.now().strftime('%Y-%m-%d'),
             'hmac_key': generate_key(32),
             'secret_key': generate_key(32)}
-    with dir_path(repo_dest):
-        shutil.copyfile('%s/settings/local.py-dist' % pkg,
-                        '%s/settings/local.py' % pkg)
-        patch("""\
-            --- a/%(pkg)s/settings/local.py
-            +++ b/%(pkg)s/settings/local.py
-            @@ -9,11 +9,11 @@ from . import base
-             DATABASES = {
-                 'default': {
-                     'ENGINE': 'django.db.backends.mysql',
-            -        'NAME': 'playdoh_app',
-            -        'USER': 'root',
-            -        'PASSWORD': '',
-            -        'HOST': '',
-            -        'PORT': '',
-            +        'NAME': '%(db_name)s',
-            +        'USER': '%(db_user)s',
-            +        'PASSWORD': '%(db_password)s',
-            +        'HOST': '%(db_host)s',
-            +        'PORT': '%(db_port)s',
-                     'OPTIONS': {
-                         'init_command': 'SET storage_engine=InnoDB',
-                         'charset' : 'utf8',
-            @@ -51,14 +51,14 @@ DEV = True
-             # Playdoh ships with Bcrypt+HMAC by default because it's the most secure.
-             # To use bcrypt, fill in a secret HMAC key. It cannot be blank.
-             HMAC_KEYS = {
-            -    #'2012-06-06': 'some secret',
-            +    '%(hmac_date)s': '%(hmac_key)s',
-             }
-
-             from django_sha2 import get_password_hashers
-             PASSWORD_HASHERS = get_password_hashers(base.BASE_PASSWORD_HASHERS, HMAC_KEYS)
-
-             # Make this unique, and don't share it with anybody.  It cannot be blank.
-            -SECRET_KEY = ''
-            +SECRET_KEY = '%(secret_key)s'
-
-             # Uncomment these to activate and customize Celery:
-             # CELERY_ALWAYS_EAGER = False  # required to activate celeryd
-            """ % vars)
-
-
-def create_virtualenv(pkg, repo_dest, python):
-    """Creates a virtualenv within which to install your new application."""
+    settings_dir = os.path.join(repo_dest, pkg, 'settings')
+    # Patch local.py-dist into a temporary file and rename it, so local.py
+    # never exists without its secrets filled in.
+    fd, tmp = tempfile.mkstemp(prefix='.local.py-', dir=settings_dir)
+    os.close(fd)
+    try:
+        _patch_settings(vars, repo_dest, tmp)
+        os.rename(tmp, os.path.join(settings_dir, 'local.py'))
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _patch_settings(vars, repo_dest, output):
+    patch("""\
+        --- a/%(pkg)s/settings/local.py-dist
+        +++ b/%(pkg)s/settings/local.py-dist
+        @@ -9,11 +9,11 @@ from . import base
+         DATABASES = {
+             'default': {
+                 'ENGINE': 'django.db.backends.mysql',
+        -        'NAME': 'playdoh_app',
+        -        'USER': 'root',
+        -        'PASSWORD': '',
+        -        'HOST': '',
+        -        'PORT': '',
+        +        'NAME': '%(db_name)s',
+        +        'USER': '%(db_user)s',
+        +        'PASSWORD': '%(db_password)s',
+        +        'HOST': '%(db_host)s',
+        +        'PORT': '%(db_port)s',
+                 'OPTIONS': {
+                     'init_command': 'SET storage_engine=InnoDB',
+                     'charset' : 'utf8',
+        @@ -51,14 +51,14 @@ DEV = True
+         # Playdoh ships with Bcrypt+HMAC by default because it's the most secure.
+         # To use bcrypt, fill in a secret HMAC key. It cannot be blank.
+         HMAC_KEYS = {
+        -    #'2012-06-06': 'some secret',
+        +    '%(hmac_date)s': '%(hmac_key)s',
+         }
+
+         from django_sha2 import get_password_hashers
+         PASSWORD_HASHERS = get_password_hashers(base.BASE_PASSWORD_HASHERS, HMAC_KEYS)
+
+         # Make this unique, and don't share it with anybody.  It cannot be blank.
+        -SECRET_KEY = ''
+        +SECRET_KEY = '%(secret_key)s'
+
+         # Uncomment these to activate and customize Celery:
+         # CELERY_ALWAYS_EAGER = False  # required to activate celeryd
+        """ % vars, cwd=repo_dest, output=output)
+
+
+def venv_path(pkg, repo_dest):
+    """Returns where create_virtualenv puts the virtualenv."""
     workon_home = os.environ.get('WORKON_HOME')
-    venv_cmd = find_executable('virtualenv')
+    if workon_home:
+        # Can't use mkvirtualenv directly here because relies too much on
+        # shell tricks. Simulate it:
+        return os.path.join(workon_home, pkg)
+    return os.path.join(repo_dest, '.virtualenv')
+
+
+def create_virtualenv(pkg, repo_dest, python, templates=None,
+                      wheel_cache=None, offline=False):
+    """
+    Creates a virtualenv within which to install your new application.
+
+    With ``templates``, it is copied from a template virtualenv in that
+    directory that already has the requirements installed, which is built
+    first if there is none for this python and requirements yet.
+    """
     python_bin = find_executable(python)
     if not python_bin:
         raise EnvironmentError('%s is not installed or not '
                                'available on your $PATH' % python)
-    if workon_home:
-        # Can't use mkvirtualenv directly here because relies too much on
-        # shell tricks. Simulate it:
-        venv = os.path.join(workon_home, pkg)
+    venv = venv_path(pkg, repo_dest)
+    if templates:
+        template = venv_template(templates, python_bin, repo_dest,
+                                 wheel_cache, offline)
+        if not verbose:
+            log.info('Copying virtual environment %r to %r'
+                     % (template, venv))
+        clone_virtualenv(template, venv)
     else:
-        venv = os.path.join(repo_dest, '.virtualenv')
+        run_virtualenv(python_bin, venv)
+    return venv
+
+
+def run_virtualenv(python_bin, venv):
+    venv_cmd = find_executable('virtualenv')
     if venv_cmd:
         if not verbose:
             log.info('Creating virtual environment in %r' % venv)
@@ -183,17 +237,222 @@ def create_virtualenv(pkg, repo_dest, python):
     else:
         raise EnvironmentError('Could not locate the virtualenv. Install with '
                                'pip install virtualenv.')
-    return venv
 
 
-def install_reqs(venv, repo_dest):
-    """Installs all compiled requirements that can't be shipped in vendor."""
-    with dir_path(repo_dest):
-        args = ['-r', 'requirements/compiled.txt']
-        if not verbose:
-            args.insert(0, '-q')
-        subprocess.check_call([os.path.join(venv, 'bin', 'pip'), 'install'] +
-                              args)
+# Written into template virtualenvs, with the path they were created at.
+TEMPLATE_MARKER = '.funfactory-template'
+
+
+def venv_template(templates, python_bin, repo_dest, wheel_cache=None,
+                  offline=False):
+    """
+    Returns the template virtualenv in ``templates`` for ``python_bin`` and
+    the requirements of ``repo_dest``, building it first if needed.
+    """
+    stat = os.stat(python_bin)
+    key = sha1('%s|%s|%s' % (os.path.realpath(python_bin), stat.st_mtime,
+                             reqs_hash(repo_dest))).hexdigest()
+    templates = os.path.abspath(templates)
+    template = os.path.join(templates, key)
+    if os.path.isdir(template):
+        return template
+    makedirs(templates)
+    # Build next to the final directory and rename, like build_wheels().
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=templates)
+    try:
+        run_virtualenv(python_bin, tmp)
+        install_reqs(tmp, repo_dest, wheel_cache, offline)
+        with open(os.path.join(tmp, TEMPLATE_MARKER), 'w') as f:
+            f.write(tmp)
+        try:
+            os.rename(tmp, template)
+        except OSError:
+            if not os.path.isdir(template):
+                raise
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+    return template
+
+
+def clone_virtualenv(template, venv):
+    """
+    Copies the virtualenv ``template`` to ``venv``, rewriting the
+    template's path to ``venv`` in scripts, .pth and .egg-link files.
+
+    Only compiled extensions and binaries in bin/ are hardlinked; everything
+    else is copied, since setuptools rewrites files like easy-install.pth in
+    place and that must not change the template or its other clones.
+    """
+    with open(os.path.join(template, TEMPLATE_MARKER)) as f:
+        old = f.read()
+    venv = os.path.abspath(venv)
+    parent = os.path.dirname(venv)
+    makedirs(parent)
+    # Copy next to the final directory and rename, so an interrupted copy is
+    # never mistaken for a virtualenv.
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        for root, dirs, files in os.walk(template):
+            dest = os.path.normpath(
+                os.path.join(tmp, os.path.relpath(root, template)))
+            if not os.path.isdir(dest):
+                os.mkdir(dest)
+            for name in dirs + files:
+                src = os.path.join(root, name)
+                dst = os.path.join(dest, name)
+                if os.path.islink(src):
+                    os.symlink(_relocate(os.readlink(src), old, venv), dst)
+                elif name in files and src != os.path.join(template,
+                                                           TEMPLATE_MARKER):
+                    _clone_file(src, dst, old, venv)
+            dirs[:] = [d for d in dirs
+                       if not os.path.islink(os.path.join(root, d))]
+        shutil.copymode(template, tmp)
+        os.rename(tmp, venv)
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+
+
+def _relocate(path, old, new):
+    if path == old or path.startswith(old + os.sep):
+        return new + path[len(old):]
+    return path
+
+
+# Nothing writes to these once they are installed, so clones of a template
+# can share them.
+SHARED_EXTENSIONS = ('.so', '.pyd', '.dylib')
+
+
+def _clone_file(src, dst, old, new):
+    in_bin = os.path.basename(os.path.dirname(src)) == 'bin'
+    if not src.endswith(SHARED_EXTENSIONS):
+        with open(src, 'rb') as f:
+            data = f.read()
+        # Binaries in bin/, like the interpreter, are shared too.
+        if not (in_bin and '\0' in data):
+            if in_bin or src.endswith(('.pth', '.egg-link')):
+                data = data.replace(old, new)
+            with open(dst, 'wb') as f:
+                f.write(data)
+            shutil.copymode(src, dst)
+            return
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Not on the same filesystem.
+        shutil.copy2(src, dst)
+
+
+# Written into the virtualenv by install_reqs, with the requirements hash.
+REQS_MARKER = '.funfactory-requirements'
+
+
+def reqs_hash(repo_dest):
+    with open(os.path.join(repo_dest, 'requirements', 'compiled.txt')) as f:
+        return sha1(f.read()).hexdigest()
+
+
+def reqs_installed(venv, repo_dest):
+    """Whether install_reqs already installed the current requirements."""
+    try:
+        with open(os.path.join(venv, REQS_MARKER)) as f:
+            return f.read().strip() == reqs_hash(repo_dest)
+    except IOError:
+        return False
+
+
+# Prints what wheels built by the virtualenv's python are compatible with.
+ABI_SCRIPT = """\
+import platform, sys
+from distutils.util import get_platform
+print('%s%s%s-%s-%s' % (platform.python_implementation(),
+                        sys.version_info[0], sys.version_info[1],
+                        sys.maxunicode > 0xffff and 'ucs4' or 'ucs2',
+                        get_platform()))
+"""
+
+
+def python_abi(venv):
+    """Returns a tag like CPython27-ucs4-linux-x86_64 for the venv python."""
+    ps = subprocess.Popen([os.path.join(venv, 'bin', 'python'), '-c',
+                           ABI_SCRIPT], stdout=subprocess.PIPE)
+    out = ps.communicate()[0]
+    if ps.returncode != 0:
+        raise RuntimeError('Could not get the ABI of %s' % venv)
+    return out.strip()
+
+
+def build_wheels(venv, repo_dest, wheel_cache, offline=False):
+    """
+    Returns the directory in ``wheel_cache`` with wheels of the compiled
+    requirements for the virtualenv's python, building them first if they
+    aren't there. Directories are named after the python ABI and the
+    requirements hash, so any number of projects can share a cache.
+    """
+    wheel_dir = os.path.join(os.path.abspath(wheel_cache), python_abi(venv),
+                             reqs_hash(repo_dest))
+    if os.path.isdir(wheel_dir):
+        return wheel_dir
+    if offline:
+        raise EnvironmentError('No wheels in %s for these requirements; '
+                               'run once without --offline to build them.'
+                               % wheel_cache)
+    parent = os.path.dirname(wheel_dir)
+    makedirs(parent)
+    pip = os.path.join(venv, 'bin', 'pip')
+    quiet = [] if verbose else ['-q']
+    subprocess.check_call([pip, 'install'] + quiet + ['wheel'])
+    # Build next to the final directory and rename, so an interrupted build
+    # is never mistaken for a complete one.
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+    try:
+        subprocess.check_call([pip, 'wheel'] + quiet +
+                              ['--wheel-dir', tmp,
+                               '-r', 'requirements/compiled.txt'],
+                              cwd=repo_dest)
+        try:
+            os.rename(tmp, wheel_dir)
+        except OSError:
+            # Another install built them at the same time.
+            if not os.path.isdir(wheel_dir):
+                raise
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+    return wheel_dir
+
+
+def install_reqs(venv, repo_dest, wheel_cache=None, offline=False):
+    """
+    Installs all compiled requirements that can't be shipped in vendor.
+
+    With ``wheel_cache``, they are installed from wheels built once per
+    requirements file and python, without touching the network.
+    """
+    args = ['-r', 'requirements/compiled.txt']
+    if wheel_cache:
+        args[:0] = ['--no-index', '--find-links',
+                    build_wheels(venv, repo_dest, wheel_cache, offline)]
+    if not verbose:
+        args.insert(0, '-q')
+    subprocess.check_call([os.path.join(venv, 'bin', 'pip'), 'install'] +
+                          args, cwd=repo_dest)
+    with open(os.path.join(venv, REQS_MARKER), 'w') as f:
+        f.write(reqs_hash(repo_dest))
+
+
+def makedirs(path):
+    """Creates ``path`` unless it exists, even if another install does."""
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # Somebody else just created it.
+            if not os.path.isdir(path):
+                raise
 
 
 def find_executable(name):
@@ -208,11 +467,14 @@ def find_executable(name):
             return candidate
 
 
-def patch(hunk):
+def patch(hunk, cwd=None, output=None):
     args = ['-p1', '-r', '.']
+    if output:
+        # Leave the patched file alone and write the result here instead.
+        args.extend(['-o', output])
     if not verbose:
         args.insert(0, '--quiet')
-    ps = subprocess.Popen(['patch'] + args, stdin=subprocess.PIPE)
+    ps = subprocess.Popen(['patch'] + args, stdin=subprocess.PIPE, cwd=cwd)
     ps.stdin.write(textwrap.dedent(hunk))
     ps.stdin.close()
     rs = ps.wait()
@@ -221,16 +483,7 @@ def patch(hunk):
                            'status %s' % (file, rs))
 
 
-@contextmanager
-def dir_path(dir):
-    """with dir_path(path) to change into a directory."""
-    old_dir = os.getcwd()
-    os.chdir(dir)
-    yield
-    os.chdir(old_dir)
-
-
-def git(cmd_args):
+def git(cmd_args, cwd=None):
     args = ['git']
     cmd = cmd_args.pop(0)
     args.append(cmd)
@@ -240,7 +493,97 @@ def git(cmd_args):
     args.extend(cmd_args)
     if verbose:
         log.info(' '.join(args))
-    subprocess.check_call(args)
+    subprocess.check_call(args, cwd=cwd)
+
+
+class Task(object):
+    """
+    A step of the install, which runs once the tasks named in ``deps`` are
+    finished unless it is already done: ``done()`` returns True, or the
+    ``marker`` file run_tasks() writes after ``func`` succeeds exists.
+    """
+
+    def __init__(self, name, func, deps=(), done=None, marker=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.done = done
+        self.marker = marker
+        self.failed = False
+        self.finished = threading.Event()
+
+    def __repr__(self):
+        return '<Task %s>' % self.name
+
+
+def run_tasks(tasks):
+    """
+    Runs each of ``tasks`` in a thread of its own as soon as its deps are
+    finished, and returns the seconds each one took (None if skipped).
+
+    Tasks depending on a failed one don't run; the first error is re-raised
+    once all the others are finished.
+    """
+    by_name = dict((task.name, task) for task in tasks)
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in by_name:
+                raise ValueError('Task %s depends on unknown task %s'
+                                 % (task.name, dep))
+    # Threads waiting on each other would hang forever.
+    ready = set()
+    pending = list(tasks)
+    while pending:
+        left = [t for t in pending if not ready.issuperset(t.deps)]
+        if len(left) == len(pending):
+            raise ValueError('Tasks %s depend on each other'
+                             % ', '.join(t.name for t in left))
+        ready.update(t.name for t in pending if t not in left)
+        pending = left
+
+    timings = {}
+    errors = []
+
+    def run(task):
+        try:
+            for dep in task.deps:
+                by_name[dep].finished.wait()
+            if any(by_name[dep].failed for dep in task.deps):
+                task.failed = True
+            elif ((task.marker and os.path.exists(task.marker)) or
+                  (task.done and task.done())):
+                timings[task.name] = None
+                log.info('[%s] already done, skipping' % task.name)
+            else:
+                start = time.time()
+                task.func()
+                if task.marker:
+                    makedirs(os.path.dirname(task.marker))
+                    open(task.marker, 'w').close()
+                timings[task.name] = time.time() - start
+                log.info('[%s] done in %.1fs' % (task.name,
+                                                 timings[task.name]))
+        except Exception:
+            task.failed = True
+            errors.append(sys.exc_info())
+            log.error('[%s] failed' % task.name)
+        finally:
+            task.finished.set()
+
+    threads = []
+    for task in tasks:
+        thread = threading.Thread(target=run, args=(task,),
+                                  name='funfactory-%s' % task.name)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        # Join with a timeout so Ctrl-C still gets through.
+        while thread.isAlive():
+            thread.join(1)
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+    return timings
 
 
 def resolve_opt(opt, prompt):
@@ -291,6 +634,21 @@ def main():
     ps.add_option('--db-port',
                   help='Database connection port. Default: %default',
                   default=None)
+    ps.add_option('--wheel-cache',
+                  help='Directory of wheels for the compiled requirements, '
+                       'shared between installs. They are built the first '
+                       'time and installed from there after that. '
+                       'Default: $FUNFACTORY_WHEEL_CACHE',
+                  default=os.environ.get('FUNFACTORY_WHEEL_CACHE'))
+    ps.add_option('--venv-templates',
+                  help='Directory of template virtualenvs with the '
+                       'requirements installed, one per python and '
+                       'requirements file. New virtualenvs are copied from '
+                       'there. Default: $FUNFACTORY_VENV_TEMPLATES',
+                  default=os.environ.get('FUNFACTORY_VENV_TEMPLATES'))
+    ps.add_option('--offline',
+                  help='Only install requirements from the wheel cache',
+                  action='store_true', default=False)
     ps.add_option('--no-input', help='Never prompt for user input',
                   action='store_true', default=False)
     ps.add_option('-q', '--quiet', help='Less output',
@@ -305,26 +663,64 @@ def main():
     if not re.match('[a-zA-Z0-9_]+', options.pkg):
         ps.error('Package name %r can only contain letters, numbers, and '
                  'underscores' % options.pkg)
-    if not find_executable('mysql_config'):
+    if options.offline and not options.wheel_cache:
+        ps.error('--offline needs a --wheel-cache')
+    if not options.offline and not find_executable('mysql_config'):
         ps.error('Cannot find mysql_config. Please install MySQL!')
     if not options.repo_dest:
         options.repo_dest = os.path.abspath(os.path.join(options.dest,
                                                          options.pkg))
-    clone_repo(options.pkg, options.dest, options.repo, options.repo_dest,
-               options.branch)
+    pkg, repo_dest = options.pkg, options.repo_dest
+
+    def marker(name):
+        # Kept in .git so they don't show up as changes in the new app.
+        return os.path.join(repo_dest, '.git', 'funfactory-%s' % name)
+
+    tasks = [
+        Task('clone',
+             lambda: clone_repo(pkg, options.dest, options.repo, repo_dest,
+                                options.branch),
+             marker=marker('clone')),
+        Task('package', lambda: init_pkg(pkg, repo_dest), deps=['clone'],
+             marker=marker('package')),
+        Task('settings',
+             lambda: create_settings(pkg, repo_dest, options.db_user,
+                                     options.db_name, options.db_password,
+                                     options.db_host, options.db_port),
+             deps=['package'], marker=marker('settings')),
+    ]
+    reqs_deps = ['clone']
     if options.venv:
         venv = options.venv
     elif os.environ.get('VIRTUAL_ENV'):
         venv = os.environ['VIRTUAL_ENV']
         log.info('Using existing virtualenv in %s' % venv)
     else:
-        venv = create_virtualenv(options.pkg, options.repo_dest, options.python)
-    install_reqs(venv, options.repo_dest)
-    init_pkg(options.pkg, options.repo_dest)
-    create_settings(options.pkg, options.repo_dest, options.db_user,
-                    options.db_name, options.db_password, options.db_host,
-                    options.db_port)
+        venv = venv_path(pkg, repo_dest)
+        # git won't clone into a directory that already has the virtualenv,
+        # and templates are picked by the requirements in the clone.
+        venv_deps = []
+        if (options.venv_templates or
+                venv.startswith(os.path.join(repo_dest, ''))):
+            venv_deps.append('clone')
+        tasks.append(Task(
+            'virtualenv',
+            lambda: create_virtualenv(pkg, repo_dest, options.python,
+                                      options.venv_templates,
+                                      options.wheel_cache, options.offline),
+            deps=venv_deps,
+            marker=os.path.join(venv, '.funfactory-virtualenv')))
+        reqs_deps.append('virtualenv')
+    tasks.append(Task('requirements',
+                      lambda: install_reqs(venv, repo_dest,
+                                           options.wheel_cache,
+                                           options.offline),
+                      deps=reqs_deps,
+                      done=lambda: reqs_installed(venv, repo_dest)))
+    start = time.time()
+    run_tasks(tasks)
     if verbose:
+        log.info('Installed in %.1fs' % (time.time() - start))
         log.info('')
         log.info('Aww yeah. Just installed you some Playdoh.')
         log.info('')
@@ -1,13 +1,49 @@
 from django.conf import settings
 from django.utils import translation
 
+from funfactory.utils import setting_changed
+
+
+# Context of the i18n processor per active language. It only depends on the
+# language and these settings.
+_i18n_contexts = {}
+_I18N_SETTINGS = ('LANGUAGES', 'LANGUAGE_URL_MAP', 'LANGUAGES_BIDI', 'DEV',
+                  'DEV_LANGUAGES', 'PROD_LANGUAGES')
+
+
+def _i18n_context(lang):
+    context = _i18n_contexts.get(lang)
+    if context is None:
+        bidi = lang.split('-')[0] in settings.LANGUAGES_BIDI
+        context = _i18n_contexts[lang] = {
+            'LANGUAGES': settings.LANGUAGES,
+            'LANG': settings.LANGUAGE_URL_MAP.get(lang) or lang,
+            'DIR': 'rtl' if bidi else 'ltr',
+        }
+    return context
+
+
+def warm_i18n(languages=None):
+    """
+    Build the i18n context for ``languages`` (default: all the supported
+    ones) ahead of the first request, e.g. from a wsgi file.
+    """
+    if languages is None:
+        languages = settings.LANGUAGE_URL_MAP.values()
+    for lang in languages:
+        _i18n_context(lang)
+
+
+def _reset_i18n_contexts(**kwargs):
+    if kwargs['setting'] in _I18N_SETTINGS:
+        _i18n_contexts.clear()
+
+setting_changed.connect(_reset_i18n_contexts)
+
 
 def i18n(request):
-    return {'LANGUAGES': settings.LANGUAGES,
-            'LANG': settings.LANGUAGE_URL_MAP.get(translation.get_language())
-                    or translation.get_language(),
-            'DIR': 'rtl' if translation.get_language_bidi() else 'ltr',
-            }
+    # A copy, since Django pushes the dict onto the template context.
+    return dict(_i18n_context(translation.get_language()))
 
 
 def globals(request):
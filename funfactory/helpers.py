@@ -11,6 +11,7 @@ from jingo import register
 import jinja2
 
 from .urlresolvers import reverse
+from .utils import LRUCache
 
 # Yanking filters from Django.
 register.filter(strip_tags)
@@ -37,13 +38,28 @@ def urlparams(url_, hash=None, **query):
     New query params will be appended to exising parameters, except duplicate
     names, which will be replaced.
     """
-    url = urlparse.urlparse(url_)
+    if '?' not in url_ and '#' not in url_ and ':' not in url_:
+        # A plain path: there is nothing to merge, so skip parsing.
+        query_string = _urlencode([(k, v) for k, v in query.items()
+                                   if v is not None])
+        if query_string:
+            url_ = '%s?%s' % (url_, query_string)
+        if hash:
+            url_ = '%s#%s' % (url_, hash)
+        return url_
+
+    parsed = _parsed_urls.get(url_)
+    if parsed is None:
+        url = urlparse.urlparse(url_)
+        # Use dict(parse_qsl) so we don't get lists of values.
+        q = url.query
+        parsed = url, dict(urlparse.parse_qsl(smart_str(q))) if q else {}
+        _parsed_urls.set(url_, parsed)
+    url, query_dict = parsed
     fragment = hash if hash is not None else url.fragment
 
-    # Use dict(parse_qsl) so we don't get lists of values.
-    q = url.query
-    query_dict = dict(urlparse.parse_qsl(smart_str(q))) if q else {}
-    query_dict.update((k, v) for k, v in query.items())
+    query_dict = dict(query_dict)
+    query_dict.update(query)
 
     query_string = _urlencode([(k, v) for k, v in query_dict.items()
                                if v is not None])
@@ -52,12 +68,13 @@ def urlparams(url_, hash=None, **query):
     return new.geturl()
 
 
+# urlparse results and their query dicts for URLs urlparams has seen.
+_parsed_urls = LRUCache(1000)
+
+
 def _urlencode(items):
     """A Unicode-safe URLencoder."""
-    try:
-        return urllib.urlencode(items)
-    except UnicodeEncodeError:
-        return urllib.urlencode([(k, smart_str(v)) for k, v in items])
+    return urllib.urlencode([(k, smart_str(v)) for k, v in items])
 
 
 @register.filter
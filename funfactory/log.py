@@ -1,22 +1,334 @@
+import atexit
 import logging
+import os
+import Queue
+import sys
+import threading
+import time
 
 from django.conf import settings
 from django.http import HttpRequest
 
 import commonware
 
+from funfactory.utils import setting_changed
+
+
+# LogQueues by name, for queue_stats().
+_queues = {}
+
+
+class LogQueue(object):
+    """
+    A bounded queue of ``(handler, record)`` pairs that ``threads`` daemon
+    threads hand to their handlers in batches, so the threads that log never
+    format records or wait on I/O. Records that arrive while the queue is
+    full are dropped and counted.
+
+    The threads are started on first use, and again in a process forked after
+    that. At exit, they get ``flush_timeout`` seconds to handle what is left.
+    """
+
+    def __init__(self, name, maxsize=10000, batch_size=100, threads=1,
+                 flush_timeout=5):
+        self.name = name
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.threads = threads
+        self.flush_timeout = flush_timeout
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        _queues[name] = self
+
+    def put(self, handler, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait((handler, record))
+        except Queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def stats(self):
+        return {'queued': self.qsize(), 'dropped': self.dropped,
+                'maxsize': self.maxsize}
+
+    def flush(self, timeout=None):
+        """
+        Wait for every queued record to be handled, for at most ``timeout``
+        seconds (default: ``flush_timeout``) so a stuck handler can't hang
+        the process at exit. Records still queued then are dropped.
+        """
+        queue = self._queue
+        if not queue or self._pid != os.getpid():
+            return
+        if timeout is None:
+            timeout = self.flush_timeout
+        deadline = time.time() + timeout
+        with queue.all_tasks_done:
+            while queue.unfinished_tasks:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                queue.all_tasks_done.wait(remaining)
+        while True:
+            try:
+                queue.get_nowait()
+            except Queue.Empty:
+                break
+            queue.task_done()
+            with self._lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = Queue.Queue(self.maxsize)
+            for i in range(self.threads):
+                thread = threading.Thread(target=self._run,
+                                          name='funfactory-log-%s-%s' %
+                                               (self.name, i))
+                thread.daemon = True
+                thread.start()
+            if self._pid is None:
+                atexit.register(self.flush)
+            self._pid = os.getpid()
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            batch = [queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(queue.get_nowait())
+            except Queue.Empty:
+                pass
+            for handler, record in batch:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+                finally:
+                    queue.task_done()
+
 
 class AreciboHandler(logging.Handler):
-    """An exception log handler that sends tracebacks to Arecibo."""
+    """
+    An exception log handler that sends tracebacks to Arecibo.
+
+    With ``workers``, reports are posted by that many background threads
+    instead of the thread that logged, with at most ``queue_size`` of them
+    waiting. With ``dedupe_window``, only the first of a run of identical
+    tracebacks is posted right away; the ones that follow within that many
+    seconds are posted as a single report with a ``count`` when it ends.
+    """
+
+    def __init__(self, level=logging.NOTSET, workers=0, queue_size=100,
+                 dedupe_window=0):
+        logging.Handler.__init__(self, level)
+        self.dedupe_window = dedupe_window
+        self.queue = None
+        if workers:
+            self.queue = LogQueue('arecibo', queue_size, batch_size=1,
+                                  threads=workers)
+        self._post = None
+        self._sender = _AreciboSender(self)
+        self._lock = threading.Lock()
+        # Traceback key -> [end time, duplicates, last duplicate record].
+        self._windows = {}
+
     def emit(self, record):
         arecibo = getattr(settings, 'ARECIBO_SERVER_URL', '')
 
         if arecibo and hasattr(record, 'request'):
+            # Keep what post() needs, since it may run in another thread.
+            record = logging.makeLogRecord(dict(
+                record.__dict__, exc_info=record.exc_info or sys.exc_info(),
+                arecibo_count=1))
+            if not self.dedupe_window or self._open_window(record):
+                self._report(record)
+
+    def _report(self, record):
+        if self.queue:
+            self.queue.put(self._sender, record)
+        else:
+            self.send(record)
+
+    def send(self, record):
+        """Post ``record`` to Arecibo in the current thread."""
+        if self._post is None:
             if getattr(settings, 'ARECIBO_USES_CELERY', False):
                 from django_arecibo.tasks import post
             else:
                 from django_arecibo.wrapper import post
-            post(record.request, 500)
+            self._post = post
+        kwargs = {}
+        if record.arecibo_count > 1:
+            kwargs['count'] = record.arecibo_count
+        exc_type, exc_value, tb = record.exc_info
+        if exc_type is None:
+            self._post(record.request, 500, **kwargs)
+            return
+        # post() reads the exception from sys.exc_info().
+        try:
+            raise exc_type, exc_value, tb
+        except Exception:
+            self._post(record.request, 500, **kwargs)
+
+    def _open_window(self, record):
+        """
+        Return whether ``record`` starts a new dedupe window. If it does not,
+        it is counted towards the report sent when the window closes.
+        """
+        key = _traceback_key(record.exc_info)
+        now = time.time()
+        closed = None
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or window[0] <= now:
+                # An expired window whose timer has not fired yet.
+                if window is not None and window[1]:
+                    closed = window[2]
+                    closed.arecibo_count = window[1]
+                    window[1] = 0
+                if len(self._windows) >= 100:
+                    self._prune(now)
+                self._windows[key] = [now + self.dedupe_window, 0, None]
+                opened = True
+            else:
+                window[1] += 1
+                window[2] = record
+                if window[1] == 1:
+                    timer = threading.Timer(window[0] - now,
+                                            self._close_window, [key, window])
+                    timer.daemon = True
+                    timer.start()
+                opened = False
+        if closed is not None:
+            self._report(closed)
+        return opened
+
+    def _close_window(self, key, window):
+        with self._lock:
+            if self._windows.get(key) is window:
+                del self._windows[key]
+            if not window[1]:
+                return
+            record = window[2]
+            record.arecibo_count = window[1]
+            window[1] = 0
+        self._report(record)
+
+    def _prune(self, now):
+        for key, window in self._windows.items():
+            if window[0] <= now and not window[1]:
+                del self._windows[key]
+
+
+class _AreciboSender(logging.Handler):
+    """Does the posting for an AreciboHandler's LogQueue."""
+
+    def __init__(self, handler):
+        logging.Handler.__init__(self)
+        self.handler = handler
+
+    def emit(self, record):
+        self.handler.send(record)
+
+
+def _traceback_key(exc_info):
+    exc_type, exc_value, tb = exc_info
+    frames = []
+    while tb is not None:
+        frames.append((tb.tb_frame.f_code.co_filename, tb.tb_lineno))
+        tb = tb.tb_next
+    return exc_type, tuple(frames)
+
+
+def queue_stats():
+    """Return the size and drop counts of every LogQueue, by name."""
+    return dict((name, queue.stats()) for name, queue in _queues.items())
+
+
+class QueueHandler(logging.Handler):
+    """Emits records to ``target`` from the thread of a LogQueue."""
+
+    def __init__(self, target, queue):
+        logging.Handler.__init__(self, target.level)
+        self.target = target
+        self.queue = queue
+
+    def emit(self, record):
+        request = getattr(record, 'request', None)
+        if request is not None:
+            # Handlers like AdminEmailHandler read the POST data, which can't
+            # be read from the input stream once the request is over.
+            try:
+                request.POST
+            except Exception:
+                pass
+        self.queue.put(self.target, record)
+
+    def flush(self):
+        self.queue.flush()
+        self.target.flush()
+
+    def close(self):
+        self.target.close()
+        logging.Handler.close(self)
+
+
+def queue_handlers(logger_names, queue, exclude=()):
+    """
+    Replace the handlers of the named loggers with QueueHandlers feeding
+    ``queue``. A handler shared by several loggers gets one QueueHandler.
+    """
+    queued = {}
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        handlers = []
+        for handler in logger.handlers:
+            if not isinstance(handler, (QueueHandler,) + tuple(exclude)):
+                if handler not in queued:
+                    queued[handler] = QueueHandler(handler, queue)
+                handler = queued[handler]
+            handlers.append(handler)
+        logger.handlers = handlers
+
+
+# The parts of the environ the cef library reads.
+CEF_ENV_KEYS = ('HTTP_X_FORWARDED_FOR', 'REMOTE_ADDR', 'REQUEST_METHOD',
+                'PATH_INFO', 'HTTP_HOST', 'HTTP_USER_AGENT')
+_CEF_SETTINGS = ('CEF_PRODUCT', 'CEF_VENDOR', 'CEF_VERSION',
+                 'CEF_DEVICE_VERSION')
+_cef_config = None
+
+
+def _get_cef_config():
+    global _cef_config
+    config = _cef_config
+    if config is None:
+        config = _cef_config = (
+            ('product', settings.CEF_PRODUCT),
+            ('vendor', settings.CEF_VENDOR),
+            ('version', settings.CEF_VERSION),
+            ('device_version', settings.CEF_DEVICE_VERSION),
+        )
+    return config
+
+
+def _reset_cef_config(**kwargs):
+    global _cef_config
+    if kwargs['setting'] in _CEF_SETTINGS:
+        _cef_config = None
+
+setting_changed.connect(_reset_cef_config)
 
 
 def log_cef(name, severity=logging.INFO, env=None, username='none',
@@ -29,10 +341,7 @@ def log_cef(name, severity=logging.INFO, env=None, username='none',
 
     cef_logger = commonware.log.getLogger('cef')
 
-    c = {'product': settings.CEF_PRODUCT,
-         'vendor': settings.CEF_VENDOR,
-         'version': settings.CEF_VERSION,
-         'device_version': settings.CEF_DEVICE_VERSION}
+    c = dict(_get_cef_config())
 
     # The CEF library looks for some things in the env object like
     # REQUEST_METHOD and any REMOTE_ADDR stuff.  Django not only doesn't send
@@ -43,11 +352,12 @@ def log_cef(name, severity=logging.INFO, env=None, username='none',
     # In theory, the last part of this if() will never be hit except in the
     # test runner.  Good luck with that.
     if isinstance(env, HttpRequest):
-        r = env.META.copy()
-    elif isinstance(env, dict):
-        r = env
-    else:
-        r = {}
+        env = env.META
+    elif not isinstance(env, dict):
+        env = {}
+    # Only copy what CEF reads; the record may be formatted after the request
+    # is gone (see CEF_ASYNC).
+    r = dict((k, env[k]) for k in CEF_ENV_KEYS if k in env)
 
     # Drop kwargs into CEF config array, then log.
     c['environ'] = r
@@ -8,6 +8,8 @@ import commonware.log
 import cef
 import dictconfig
 
+from funfactory.log import LogQueue, queue_handlers
+
 
 class NullHandler(logging.Handler):
     def emit(self, record):
@@ -57,6 +59,12 @@ cfg = {
         'arecibo': {
             'level': 'ERROR',
             'class': 'funfactory.log.AreciboHandler',
+            # Post from background threads and collapse repeated tracebacks
+            # into one report per window, so an error storm doesn't slow
+            # down every request.
+            'workers': getattr(settings, 'ARECIBO_WORKERS', 0),
+            'queue_size': getattr(settings, 'ARECIBO_QUEUE_SIZE', 100),
+            'dedupe_window': getattr(settings, 'ARECIBO_DEDUPE_WINDOW', 0),
         },
         'mail_admins': {
             'level': 'ERROR',
@@ -105,3 +113,17 @@ for logger in cfg['loggers'].values() + [cfg['root']]:
         logger['propagate'] = False
 
 dictconfig.dictConfig(cfg)
+
+if settings.CEF_ASYNC:
+    queue_handlers(['cef'],
+                   LogQueue('cef', settings.CEF_QUEUE_SIZE,
+                            flush_timeout=settings.LOGGING_QUEUE_FLUSH_TIMEOUT),
+                   exclude=[NullHandler])
+
+# Put every handler not queued yet behind one queue and its thread. The root
+# logger is ''.
+if settings.LOGGING_QUEUE:
+    queue_handlers(cfg['loggers'].keys() + [''],
+                   LogQueue('logging', settings.LOGGING_QUEUE_SIZE,
+                            flush_timeout=settings.LOGGING_QUEUE_FLUSH_TIMEOUT),
+                   exclude=[NullHandler])
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
+import __builtin__
+from contextlib import contextmanager
+import json
 import logging
 import os
-import site
 import sys
+import time
 import warnings
 
 
@@ -18,6 +21,122 @@ def path(*a):
     return os.path.join(ROOT, *a)
 
 
+class StartupProfiler(object):
+    """
+    Records how long each phase of setup_environ() takes and how long every
+    module first imported during it took to import.
+
+    Enable it by pointing the ``FF_PROFILE_STARTUP`` environment variable at
+    the file the report should be written to (``-`` for stderr).
+    """
+
+    def __init__(self):
+        self.phases = []
+        # Module names -> [cumulative seconds, seconds excluding children]
+        self.imports = {}
+        self._children = []
+        self._import = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+
+    def start(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self._timed_import
+
+    def stop(self):
+        __builtin__.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=None,
+                      level=-1):
+        if self._loaded(name, globals, fromlist, level):
+            # Nothing to load, so nothing worth the sys.modules snapshots.
+            return self._import(name, globals, locals, fromlist, level)
+        overhead_start = time.time()
+        before = set(sys.modules)
+        # [seconds, modules loaded, profiler overhead] of the imports this
+        # one makes.
+        self._children.append([0.0, set(), 0.0])
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            end = time.time()
+            children, claimed, overhead = self._children.pop()
+            elapsed = end - start - overhead
+            # Python 2 leaves None in sys.modules for failed relative lookups.
+            added = set(mod for mod in sys.modules
+                        if mod not in before and sys.modules[mod] is not None)
+            if self._children:
+                parent = self._children[-1]
+                parent[0] += elapsed
+                parent[1].update(added)
+            added -= claimed
+            if added:
+                # Only imports that actually loaded something are reported,
+                # named after what they loaded since `from . import x` passes
+                # an empty name. Parents of loaded submodules are left out.
+                key = ', '.join(sorted(
+                    mod for mod in added
+                    if not [m for m in added if m.startswith(mod + '.')]))
+                times = self.imports.setdefault(key, [0.0, 0.0])
+                times[0] += elapsed
+                times[1] += elapsed - children
+            if self._children:
+                self._children[-1][2] += (overhead + start - overhead_start +
+                                          time.time() - end)
+
+    def _loaded(self, name, globals, fromlist, level):
+        """Whether importing `name` can only return an already loaded module."""
+        if fromlist or level > 0 or name not in sys.modules:
+            return False
+        if level < 0 and globals:
+            # Python 2 first looks for `name` next to the importing module.
+            package = globals.get('__package__')
+            if package is None:
+                package = globals.get('__name__') or ''
+                if '__path__' not in globals:
+                    package = package.rpartition('.')[0]
+            if package and '%s.%s' % (package, name) not in sys.modules:
+                return False
+        return True
+
+    def report(self):
+        """Return the profile as text, slowest entries first."""
+        lines = ['# setup_environ() startup profile',
+                 '# total: %.1f ms' % (sum(t for _, t in self.phases) * 1000),
+                 '', '%10s  %s' % ('ms', 'phase')]
+        lines.extend('%10.1f  %s' % (t * 1000, name)
+                     for name, t in self.phases)
+        lines.extend(['', '%10s %10s  %s' % ('cum ms', 'self ms', 'import')])
+        imports = sorted(self.imports.items(),
+                         key=lambda item: (-item[1][0], item[0]))
+        lines.extend('%10.1f %10.1f  %s' % (cum * 1000, own * 1000, name)
+                     for name, (cum, own) in imports)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, dest):
+        if dest == '-':
+            sys.stderr.write(self.report())
+        else:
+            with open(dest, 'w') as f:
+                f.write(self.report())
+
+
+@contextmanager
+def _phase(profiler, name):
+    if profiler is None:
+        yield
+    else:
+        with profiler.phase(name):
+            yield
+
+
 def setup_environ(manage_file, settings=None, more_pythonic=False):
     """Sets up a Django app within a manage.py file.
 
@@ -30,60 +149,174 @@ def setup_environ(manage_file, settings=None, more_pythonic=False):
     **more_pythonic**
         When True, does not do any path hackery besides adding the vendor dirs.
         This requires a newer Playdoh layout without top level apps, lib, etc.
+
+    Set the ``FF_PROFILE_STARTUP`` environment variable to profile this
+    function; see StartupProfiler. Set ``FF_SYS_PATH_CACHE`` to a file path
+    to cache the vendor dirs' sys.path entries; see site_dir_entries.
     """
+    profile_dest = os.environ.get('FF_PROFILE_STARTUP')
+    if not profile_dest:
+        return _setup_environ(manage_file, settings, more_pythonic)
+
+    profiler = StartupProfiler()
+    profiler.start()
+    try:
+        _setup_environ(manage_file, settings, more_pythonic, profiler)
+    finally:
+        profiler.stop()
+        profiler.write(profile_dest)
+
+
+def _setup_environ(manage_file, settings, more_pythonic, profiler=None):
     # sys is global to avoid undefined local
     global sys, current_settings, execute_from_command_line, ROOT
 
     ROOT = os.path.dirname(os.path.abspath(manage_file))
 
-    # Adjust the python path and put local packages in front.
-    prev_sys_path = list(sys.path)
-
-    # Make root application importable without the need for
-    # python setup.py install|develop
-    sys.path.append(ROOT)
-
-    if not more_pythonic:
-        warnings.warn("You're using an old-style Playdoh layout with a top "
-                      "level __init__.py and apps directories. This is error "
-                      "prone and fights the Zen of Python. "
-                      "See http://playdoh.readthedocs.org/en/latest/"
-                      "getting-started/upgrading.html")
-        # Give precedence to your app's parent dir, which contains __init__.py
-        sys.path.append(os.path.abspath(os.path.join(ROOT, os.pardir)))
-
-        site.addsitedir(path('apps'))
-        site.addsitedir(path('lib'))
-
-    # Local (project) vendor library
-    site.addsitedir(path('vendor-local'))
-    site.addsitedir(path('vendor-local/lib/python'))
-
-    # Global (upstream) vendor library
-    site.addsitedir(path('vendor'))
-    site.addsitedir(path('vendor/lib/python'))
-
-    # Move the new items to the front of sys.path. (via virtualenv)
-    new_sys_path = []
-    for item in list(sys.path):
-        if item not in prev_sys_path:
-            new_sys_path.append(item)
-            sys.path.remove(item)
-    sys.path[:0] = new_sys_path
-
-    from django.core.management import execute_from_command_line  # noqa
-    if not settings:
-        if 'DJANGO_SETTINGS_MODULE' in os.environ:
-            settings = import_mod_by_name(os.environ['DJANGO_SETTINGS_MODULE'])
-        elif os.path.isfile(os.path.join(ROOT, 'settings_local.py')):
-            import settings_local as settings
-            warnings.warn("Using settings_local.py is deprecated. See "
-                          "http://playdoh.readthedocs.org/en/latest/upgrading.html",
-                          DeprecationWarning)
-        else:
-            import settings
+    with _phase(profiler, 'sys.path'):
+        # Make root application importable without the need for
+        # python setup.py install|develop
+        plain_dirs = [ROOT]
+        site_dirs = []
+
+        if not more_pythonic:
+            warnings.warn("You're using an old-style Playdoh layout with a top "
+                          "level __init__.py and apps directories. This is "
+                          "error prone and fights the Zen of Python. "
+                          "See http://playdoh.readthedocs.org/en/latest/"
+                          "getting-started/upgrading.html")
+            # Give precedence to your app's parent dir, which contains
+            # __init__.py
+            plain_dirs.append(os.path.abspath(os.path.join(ROOT, os.pardir)))
+
+            site_dirs.extend([path('apps'), path('lib')])
+
+        # Local (project) vendor library
+        site_dirs.extend([path('vendor-local'),
+                          path('vendor-local/lib/python')])
+
+        # Global (upstream) vendor library
+        site_dirs.extend([path('vendor'), path('vendor/lib/python')])
+
+        # Put local packages in front of sys.path. (via virtualenv)
+        entries, pth_imports = site_dir_entries(
+            site_dirs, os.environ.get('FF_SYS_PATH_CACHE'))
+        prepend_sys_path(plain_dirs + entries)
+        for line in pth_imports:
+            exec(line, {})
+
+    with _phase(profiler, 'import django.core.management'):
+        from django.core.management import execute_from_command_line  # noqa
+
+    with _phase(profiler, 'import settings'):
+        if not settings:
+            if 'DJANGO_SETTINGS_MODULE' in os.environ:
+                settings = import_mod_by_name(
+                    os.environ['DJANGO_SETTINGS_MODULE'])
+            elif os.path.isfile(os.path.join(ROOT, 'settings_local.py')):
+                import settings_local as settings
+                warnings.warn("Using settings_local.py is deprecated. See "
+                              "http://playdoh.readthedocs.org/en/latest/upgrading.html",
+                              DeprecationWarning)
+            else:
+                import settings
     current_settings = settings
-    validate_settings(settings)
+
+    with _phase(profiler, 'validate_settings'):
+        validate_settings(settings)
+
+
+def _read_site_dir(site_dir):
+    """
+    Return the paths site.addsitedir() would add for ``site_dir`` and the
+    import lines of its .pth files, or two empty lists if it is missing.
+    """
+    try:
+        names = os.listdir(site_dir)
+    except OSError:
+        return [], []
+    paths = [site_dir]
+    imports = []
+    for name in sorted(names):
+        if not name.endswith(os.extsep + 'pth'):
+            continue
+        try:
+            f = open(os.path.join(site_dir, name), 'rU')
+        except IOError:
+            continue
+        with f:
+            for line in f:
+                if line.startswith('#'):
+                    continue
+                if line.startswith(('import ', 'import\t')):
+                    imports.append(line)
+                    continue
+                entry = os.path.abspath(os.path.join(site_dir, line.rstrip()))
+                if os.path.exists(entry):
+                    paths.append(entry)
+    return paths, imports
+
+
+def site_dir_entries(site_dirs, cache_file=None):
+    """
+    Return ``(paths, import_lines)`` for a list of site dirs, reading each
+    dir and its .pth files once.
+
+    With ``cache_file`` the result is saved there and reused for as long as
+    the mtimes of the site dirs stay the same. Editing a .pth file in place
+    does not change its dir's mtime; delete the cache file after doing that.
+    """
+    site_dirs = [os.path.abspath(d) for d in site_dirs]
+    key = None
+    if cache_file:
+        mtimes = []
+        for site_dir in site_dirs:
+            try:
+                mtimes.append('%s:%r' % (site_dir, os.path.getmtime(site_dir)))
+            except OSError:
+                mtimes.append('%s:-' % site_dir)
+        key = '|'.join(mtimes)
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached['key'] == key:
+                return cached['paths'], cached['imports']
+        except (IOError, ValueError, KeyError):
+            pass
+
+    paths = []
+    imports = []
+    for site_dir in site_dirs:
+        dir_paths, dir_imports = _read_site_dir(site_dir)
+        paths.extend(dir_paths)
+        imports.extend(dir_imports)
+
+    if cache_file:
+        tmp = '%s.%s.tmp' % (cache_file, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'key': key, 'paths': paths, 'imports': imports}, f)
+            os.rename(tmp, cache_file)
+        except (IOError, OSError):
+            log.warning('Could not write sys.path cache %s' % cache_file)
+    return paths, imports
+
+
+def prepend_sys_path(entries):
+    """
+    Put ``entries`` in front of sys.path in one pass, skipping any entry that
+    is already on it or repeated. Relative sys.path entries like '' (the
+    current directory) don't count, since they follow os.chdir().
+    """
+    known = set(os.path.normcase(os.path.normpath(p)) for p in sys.path
+                if os.path.isabs(p))
+    new = []
+    for entry in entries:
+        normalized = os.path.normcase(os.path.normpath(entry))
+        if normalized not in known:
+            known.add(normalized)
+            new.append(entry)
+    sys.path[:0] = new
 
 
 def validate_settings(settings):
@@ -0,0 +1,64 @@
+import json
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import NoReverseMatch
+
+from funfactory.urlmap import render_urls, write_url_map
+
+
+def parse_view(spec):
+    """Turn ``name:arg,key=value`` into ``(name, args, kwargs)``."""
+    viewname, _, params = spec.partition(':')
+    args, kwargs = [], {}
+    for param in filter(None, params.split(',')):
+        key, eq, value = param.partition('=')
+        if eq:
+            kwargs[key] = value
+        else:
+            args.append(param)
+    return viewname, args, kwargs
+
+
+class Command(BaseCommand):
+    args = '<viewname[:arg,key=value,...]> ...'
+    help = ('Reverses views for every locale on a pool of processes and '
+            'writes the URLs to a map file (see funfactory.urlmap).')
+    option_list = BaseCommand.option_list + (
+        make_option('-o', '--output',
+                    help='File to write the map to. Gzipped if it ends '
+                         'in .gz.'),
+        make_option('--views', dest='views_file',
+                    help='JSON file with more views, as a list of '
+                         '[viewname, args, kwargs].'),
+        make_option('--locales',
+                    help='Comma separated locales. Default: PROD_LANGUAGES.'),
+        make_option('-p', '--processes', type='int',
+                    help='Number of processes. Default: one per CPU.'),
+        make_option('--chunk-size', type='int', default=500,
+                    help='Views reversed per task. Default: %default'),
+    )
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('--output is required.')
+        views = [parse_view(spec) for spec in args]
+        if options['views_file']:
+            with open(options['views_file']) as f:
+                views.extend(json.load(f))
+        if not views:
+            raise CommandError('No views to reverse.')
+        if options['locales']:
+            locales = options['locales'].split(',')
+        else:
+            locales = settings.PROD_LANGUAGES
+
+        try:
+            url_map = render_urls(views, locales, options['processes'],
+                                  options['chunk_size'])
+        except NoReverseMatch as e:
+            raise CommandError(e)
+        write_url_map(options['output'], url_map)
+        self.stdout.write('Wrote %s URLs in %s locales to %s\n' % (
+            len(url_map['urls']), len(locales), options['output']))
@@ -10,12 +10,85 @@ from warnings import warn
 
 from django.conf import settings
 from django.http import HttpResponsePermanentRedirect
+from django.utils import translation
+from django.utils.cache import patch_cache_control
 from django.utils.encoding import smart_str
 
 import tower
 
 from . import urlresolvers
 from .helpers import urlparams
+from .utils import LRUCache, setting_changed
+
+
+# Locale redirects as (location, vary) keyed on the path, script name, query
+# string and negotiated locale of bare (locale-less) requests. Sized by
+# settings.FF_LOCALE_REDIRECT_CACHE_SIZE.
+_redirect_cache = None
+_REDIRECT_SETTINGS = ('LANGUAGE_URL_MAP', 'CANONICAL_LOCALES', 'DEV',
+                      'DEV_LANGUAGES', 'PROD_LANGUAGES', 'SUPPORTED_NONLOCALES',
+                      'FF_LOCALE_REDIRECT_CACHE_SIZE', 'FF_LOCALE_VARY_HEADER')
+
+
+def _get_redirect_cache():
+    global _redirect_cache
+    cache = _redirect_cache
+    if cache is None:
+        size = getattr(settings, 'FF_LOCALE_REDIRECT_CACHE_SIZE', 1000)
+        cache = _redirect_cache = LRUCache(size)
+    return cache
+
+
+def redirect_cache_info():
+    """Return hit/miss counters for the locale redirect cache."""
+    return _get_redirect_cache().info()
+
+
+def _reset_redirect_cache(**kwargs):
+    global _redirect_cache
+    if kwargs['setting'] in _REDIRECT_SETTINGS:
+        _redirect_cache = None
+
+setting_changed.connect(_reset_redirect_cache)
+
+
+class PathPrefixTrie(object):
+    """
+    Matches paths against a set of URL prefixes one path segment at a time.
+
+    A prefix matches a path when all of its segments equal the leading
+    segments of the path, so ``static`` matches ``/static/`` and
+    ``/static/css/site.css`` but not ``/staticfiles/``.
+    """
+    END = None
+
+    def __init__(self, prefixes=()):
+        self.root = {}
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix):
+        prefix = prefix.strip('/')
+        if not prefix:
+            return
+        node = self.root
+        for segment in prefix.split('/'):
+            node = node.setdefault(segment, {})
+        node[self.END] = True
+
+    def match(self, path):
+        node = self.root
+        rest = path.lstrip('/')
+        while node:
+            segment, sep, rest = rest.partition('/')
+            node = node.get(segment)
+            if node is None:
+                return False
+            if self.END in node:
+                return True
+            if not sep:
+                return False
+        return False
 
 
 class LocaleURLMiddleware(object):
@@ -23,6 +96,17 @@ class LocaleURLMiddleware(object):
     1. Search for the locale.
     2. Save it in the request.
     3. Strip them from the URL.
+
+    Requests under ``FF_EXEMPT_LOCALE_PREFIXES`` (``SUPPORTED_NONLOCALES`` by
+    default) never get a locale and skip all of this, though URLs reversed
+    while handling them are still prefixed.
+
+    Redirects get the Cache-Control directives in
+    ``FF_LOCALE_REDIRECT_CACHE_CONTROL`` (e.g. ``{'public': True,
+    'max_age': 3600}``) so a CDN can serve them. A CDN that reduces
+    Accept-Language to a small set of language groups can pass the result in
+    the header named by ``FF_LOCALE_VARY_HEADER``; locales are then
+    negotiated from, and redirects vary on, that header instead.
     """
 
     def __init__(self):
@@ -32,6 +116,10 @@ class LocaleURLMiddleware(object):
                  "LocaleURLMiddleware from your MIDDLEWARE_CLASSES setting.")
 
         self.exempt_urls = getattr(settings, 'FF_EXEMPT_LANG_PARAM_URLS', ())
+        exempt_prefixes = getattr(settings, 'FF_EXEMPT_LOCALE_PREFIXES', None)
+        if exempt_prefixes is None:
+            exempt_prefixes = settings.SUPPORTED_NONLOCALES
+        self.exempt_prefixes = PathPrefixTrie(exempt_prefixes)
 
     def _is_lang_change(self, request):
         """Return True if the lang param is present and URL isn't exempt."""
@@ -41,9 +129,16 @@ class LocaleURLMiddleware(object):
         return not any(request.path.endswith(url) for url in self.exempt_urls)
 
     def process_request(self, request):
+        if self.exempt_prefixes.match(request.path_info):
+            # Links rendered here still get a locale, but Prefixer only
+            # splits the path and negotiates if reverse() asks it to.
+            urlresolvers.set_url_prefix(urlresolvers.Prefixer(request))
+            request.locale = ''
+            translation.deactivate()
+            return
+
         prefixer = urlresolvers.Prefixer(request)
         urlresolvers.set_url_prefix(prefixer)
-        full_path = prefixer.fix(prefixer.shortened_path)
 
         if self._is_lang_change(request):
             # Blank out the locale so that we can set a new one. Remove lang
@@ -51,8 +146,24 @@ class LocaleURLMiddleware(object):
             prefixer.locale = ''
             new_path = prefixer.fix(prefixer.shortened_path)
             query = dict((smart_str(k), request.GET[k]) for k in request.GET)
-            query.pop('lang')
-            return HttpResponsePermanentRedirect(urlparams(new_path, **query))
+            lang = query.pop('lang')
+            # An unsupported lang falls back to the Accept-Language header.
+            vary = lang.lower() not in urlresolvers.get_locale_index().exact
+            return self._redirect(urlparams(new_path, **query), vary)
+
+        # Requests without a locale get the same redirect for the same URL
+        # and negotiated locale.
+        cache = _get_redirect_cache()
+        key = None
+        if cache.maxsize and not prefixer.locale:
+            key = (request.path, request.META.get('SCRIPT_NAME', ''),
+                   request.META.get('QUERY_STRING', ''),
+                   prefixer.get_language())
+            redirect = cache.get(key)
+            if redirect is not None:
+                return self._redirect(*redirect)
+
+        full_path = prefixer.fix(prefixer.shortened_path)
 
         if full_path != request.path:
             query_string = request.META.get('QUERY_STRING', '')
@@ -61,16 +172,33 @@ class LocaleURLMiddleware(object):
             if query_string:
                 full_path = '%s?%s' % (full_path, query_string)
 
-            response = HttpResponsePermanentRedirect(full_path)
-
-            # Vary on Accept-Language if we changed the locale
+            # Vary on Accept-Language (or FF_LOCALE_VARY_HEADER) if we
+            # changed the locale. It comes after SCRIPT_NAME.
             old_locale = prefixer.locale
-            new_locale, _ = urlresolvers.split_path(full_path)
-            if old_locale != new_locale:
-                response['Vary'] = 'Accept-Language'
-
-            return response
+            script_name = urllib.quote(request.META['SCRIPT_NAME'])
+            new_locale, _ = urlresolvers.split_path(
+                full_path[len(script_name):])
+            redirect = (full_path, old_locale != new_locale)
+            if key is not None:
+                cache.set(key, redirect)
+            return self._redirect(*redirect)
 
         request.path_info = '/' + prefixer.shortened_path
         request.locale = prefixer.locale
         tower.activate(prefixer.locale)
+
+    def _redirect(self, location, vary):
+        response = HttpResponsePermanentRedirect(location)
+        if vary:
+            response['Vary'] = urlresolvers.get_language_header()[0]
+        cache_control = getattr(settings, 'FF_LOCALE_REDIRECT_CACHE_CONTROL',
+                                None)
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+        return response
+
+    def process_response(self, request, response):
+        # Don't let this request's prefix leak into whatever the thread or
+        # greenlet serves next.
+        urlresolvers.set_url_prefix(None)
+        return response
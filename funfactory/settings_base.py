@@ -1,5 +1,6 @@
 # Django settings file for a project based on the playdoh template.
 # import * into your settings_local.py
+from collections import Mapping
 import logging
 import os
 import socket
@@ -39,12 +40,25 @@ HAS_SYSLOG = True
 SYSLOG_TAG = "http_app_playdoh"  # Change this after you fork.
 LOGGING_CONFIG = None
 LOGGING = {}
+# Hand log records to the handlers from a background thread, through a queue
+# of at most LOGGING_QUEUE_SIZE records, so logging never blocks a request on
+# formatting, syslog or SMTP. Records arriving while it is full are dropped;
+# see funfactory.log.queue_stats for the counts. At exit, the thread gets
+# LOGGING_QUEUE_FLUSH_TIMEOUT seconds to handle what is still queued.
+LOGGING_QUEUE = False
+LOGGING_QUEUE_SIZE = 10000
+LOGGING_QUEUE_FLUSH_TIMEOUT = 5
 
 # CEF Logging
 CEF_PRODUCT = 'Playdoh'
 CEF_VENDOR = 'Mozilla'
 CEF_VERSION = '0'
 CEF_DEVICE_VERSION = '0'
+# Log CEF events from a background thread, so a slow syslog doesn't hold up
+# requests. At most CEF_QUEUE_SIZE events wait; more are dropped and counted
+# (see funfactory.log.queue_stats).
+CEF_ASYNC = False
+CEF_QUEUE_SIZE = 10000
 
 
 # Internationalization.
@@ -87,23 +101,110 @@ PROD_DETAILS_DIR = path('lib/product_details_json')
 # the root locale directory.  A localizer can add their locale in the l10n
 # repository (copy of which is checked out into `locale`) in order to start
 # testing the localization on the dev server.
+#
+# Discovery is lazy: the locale dirs are only listed the first time
+# DEV_LANGUAGES is read in a process, which only happens on dev instances.
+# The listing is cached in the DEV_LANGUAGES_MANIFEST file (default: a file
+# in a directory of the temp dir only the current user can use) until one
+# of the locale dirs changes.
 import glob
-import itertools
-DEV_LANGUAGES = None
-try:
-    DEV_LANGUAGES = [
-        os.path.basename(loc).replace('_', '-')
-        for loc in itertools.chain(glob.iglob(ROOT + '/locale/*'),  # old style
-                                   glob.iglob(ROOT + '/*/locale/*'))
-        if (os.path.isdir(loc) and os.path.basename(loc) != 'templates')
-    ]
-except OSError:
-    pass
-
-# If the locale/ directory isn't there or it's empty, we make sure that
-# we always have at least 'en-US'.
-if not DEV_LANGUAGES:
-    DEV_LANGUAGES = ('en-US',)
+import hashlib
+import json
+import stat
+import tempfile
+
+DEV_LANGUAGES_MANIFEST = None
+
+_dev_languages = [None, None]  # [signature, languages] of the last discovery
+_resolved_dev_languages = []  # What DEV_LANGUAGES resolved to.
+
+
+def discover_dev_languages(locale_dirs, manifest=None):
+    """
+    Return the locales in ``locale_dirs``, reusing the ones saved in the
+    ``manifest`` file while the mtimes of the dirs stay the same.
+    """
+    signature = []
+    for locale_dir in locale_dirs:
+        try:
+            signature.append('%s:%r' % (locale_dir,
+                                        os.path.getmtime(locale_dir)))
+        except OSError:
+            pass
+    if _dev_languages[0] == signature:
+        return list(_dev_languages[1])
+
+    langs = None
+    if manifest:
+        try:
+            with open(manifest) as f:
+                cached = json.load(f)
+            if cached['signature'] == signature:
+                langs = [str(lang) for lang in cached['languages']]
+        except (IOError, ValueError, KeyError):
+            pass
+
+    if langs is None:
+        langs = []
+        for locale_dir in locale_dirs:
+            try:
+                names = sorted(os.listdir(locale_dir))
+            except OSError:
+                continue
+            langs.extend(name.replace('_', '-') for name in names
+                         if (name != 'templates' and
+                             os.path.isdir(os.path.join(locale_dir, name))))
+        if manifest:
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(manifest),
+                                           suffix='.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump({'signature': signature, 'languages': langs}, f)
+                os.rename(tmp, manifest)
+            except (IOError, OSError):
+                pass
+
+    _dev_languages[:] = [signature, langs]
+    return list(langs)
+
+
+def _private_tmp_dir():
+    """
+    Return a directory in the temp dir that only the current user can use,
+    or None if somebody else got there first.
+    """
+    tmp = os.path.join(tempfile.gettempdir(), 'funfactory-%s' % os.getuid())
+    try:
+        os.mkdir(tmp, 0700)
+    except OSError:
+        pass
+    st = os.lstat(tmp)
+    if (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and
+            not st.st_mode & 077):
+        return tmp
+
+
+def lazy_dev_languages():
+    # lazy() calls this on every use of DEV_LANGUAGES, so only discover once.
+    if _resolved_dev_languages:
+        return _resolved_dev_languages
+    from django.conf import settings
+    manifest = getattr(settings, 'DEV_LANGUAGES_MANIFEST', None)
+    if not manifest:
+        tmp = _private_tmp_dir()
+        if tmp:
+            manifest = os.path.join(tmp, 'dev-languages-%s.json' %
+                                    hashlib.md5(ROOT).hexdigest())
+    # The root locale dir is for old style Playdoh apps.
+    langs = discover_dev_languages([path('locale')] +
+                                   sorted(glob.glob(path('*', 'locale'))),
+                                   manifest)
+    # If the locale/ directory isn't there or it's empty, we make sure that
+    # we always have at least 'en-US'.
+    _resolved_dev_languages[:] = langs or ['en-US']
+    return _resolved_dev_languages
+
+DEV_LANGUAGES = lazy(lazy_dev_languages, list)()
 
 # On stage/prod, the list of accepted locales is manually maintained.  Only
 # locales whose localizers have signed off on their work should be listed here.
@@ -119,23 +220,99 @@ CANONICAL_LOCALES = {
 }
 
 
+class ResolvedMapping(Mapping):
+    """
+    A read-only mapping built by calling ``func`` on first access, after the
+    settings are configured. The result is kept until one of the settings
+    named in ``depends_on`` changes, so lookups are plain dict operations
+    rather than a call to ``func`` each time like a lazy() proxy.
+    """
+
+    def __init__(self, func, depends_on=()):
+        self.func = func
+        self.depends_on = frozenset(depends_on)
+        self._value = None
+
+    def _resolve(self):
+        value = self._value
+        if value is None:
+            from funfactory.utils import setting_changed
+            setting_changed.connect(self._reset, weak=False,
+                                    dispatch_uid='ff-resolved-%s' % id(self))
+            value = self._value = dict(self.func())
+        return value
+
+    def _reset(self, **kwargs):
+        if kwargs['setting'] in self.depends_on:
+            self._value = None
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __contains__(self, key):
+        return key in self._resolve()
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __eq__(self, other):
+        if isinstance(other, ResolvedMapping):
+            other = other._resolve()
+        return self._resolve() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self._resolve())
+
+    def get(self, key, default=None):
+        return self._resolve().get(key, default)
+
+    def keys(self):
+        return self._resolve().keys()
+
+    def values(self):
+        return self._resolve().values()
+
+    def items(self):
+        return self._resolve().items()
+
+    def iterkeys(self):
+        return self._resolve().iterkeys()
+
+    def itervalues(self):
+        return self._resolve().itervalues()
+
+    def iteritems(self):
+        return self._resolve().iteritems()
+
+    def copy(self):
+        return self._resolve().copy()
+
+
 def lazy_lang_url_map():
     from django.conf import settings
     langs = settings.DEV_LANGUAGES if settings.DEV else settings.PROD_LANGUAGES
     return dict([(i.lower(), i) for i in langs])
 
-LANGUAGE_URL_MAP = lazy(lazy_lang_url_map, dict)()
+LANGUAGE_URL_MAP = ResolvedMapping(
+    lazy_lang_url_map, ('DEV', 'DEV_LANGUAGES', 'PROD_LANGUAGES'))
 
 
 # Override Django's built-in with our native names
 def lazy_langs():
     from django.conf import settings
     from product_details import product_details
-    langs = DEV_LANGUAGES if settings.DEV else settings.PROD_LANGUAGES
+    langs = settings.DEV_LANGUAGES if settings.DEV else settings.PROD_LANGUAGES
     return dict([(lang.lower(), product_details.languages[lang]['native'])
                  for lang in langs if lang in product_details.languages])
 
-LANGUAGES = lazy(lazy_langs, dict)()
+LANGUAGES = ResolvedMapping(
+    lazy_langs, ('DEV', 'DEV_LANGUAGES', 'PROD_LANGUAGES'))
 
 # Tells the extract script what files to look for L10n in and what function
 # handles the extraction. The Tower library expects this.
@@ -242,22 +419,38 @@ STATICFILES_FINDERS = (
 )
 
 
+# Share compiled templates between processes. One of None (off),
+# 'filesystem' (stored in JINJA_BYTECODE_CACHE_DIR, which must be owned by
+# and only writable by the app's user, or a private directory in the system
+# temp dir when that is None) or 'django' (stored in the
+# JINJA_BYTECODE_CACHE_ALIAS Django cache).
+JINJA_BYTECODE_CACHE = None
+JINJA_BYTECODE_CACHE_DIR = None
+JINJA_BYTECODE_CACHE_ALIAS = 'default'
+
+# How many compiled templates each process keeps in memory. -1 never evicts.
+JINJA_CACHE_SIZE = 50
+
+
 def JINJA_CONFIG():
-    # import jinja2
-    # from django.conf import settings
-    # from caching.base import cache
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
     config = {'extensions': ['tower.template.i18n', 'jinja2.ext.do',
                              'jinja2.ext.with_', 'jinja2.ext.loopcontrols'],
-              'finalize': lambda x: x if x is not None else ''}
-#    if 'memcached' in cache.scheme and not settings.DEBUG:
-#        # We're passing the _cache object directly to jinja because
-#        # Django can't store binary directly; it enforces unicode on it.
-#        # Details: http://jinja.pocoo.org/2/documentation/api#bytecode-cache
-#        # and in the errors you get when you try it the other way.
-#        bc = jinja2.MemcachedBytecodeCache(cache._cache,
-#                                           "%sj2:" % settings.CACHE_PREFIX)
-#        config['cache_size'] = -1 # Never clear the cache
-#        config['bytecode_cache'] = bc
+              'finalize': lambda x: x if x is not None else '',
+              'cache_size': settings.JINJA_CACHE_SIZE}
+    backend = settings.JINJA_BYTECODE_CACHE
+    if backend == 'filesystem':
+        from funfactory.bytecode_cache import FileSystemBytecodeCache
+        config['bytecode_cache'] = FileSystemBytecodeCache(
+            settings.JINJA_BYTECODE_CACHE_DIR)
+    elif backend == 'django':
+        from funfactory.bytecode_cache import DjangoBytecodeCache
+        config['bytecode_cache'] = DjangoBytecodeCache(
+            settings.JINJA_BYTECODE_CACHE_ALIAS)
+    elif backend:
+        raise ImproperlyConfigured('Unknown JINJA_BYTECODE_CACHE %r; use '
+                                   "'filesystem' or 'django'." % backend)
     return config
 
 
@@ -0,0 +1,157 @@
+"""
+Sitemaps for sites with more localized URLs than fit in memory.
+
+URLs are written to disk as they are generated, in files of at most 50,000
+URLs, followed by a sitemap index listing the files::
+
+    from funfactory.sitemaps import locale_urls, SitemapWriter
+
+    def views():
+        yield 'home', (), {}
+        for pk in Item.objects.values_list('pk', flat=True).iterator():
+            yield 'items.detail', (pk,), {}
+
+    with SitemapWriter('/srv/www/sitemaps', gzip=True) as sitemap:
+        sitemap.extend(locale_urls(views))
+"""
+import gzip as gzip_module
+import os
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils.encoding import smart_str
+
+from funfactory.urlresolvers import locale_prefixer, reverse, url_prefix
+from funfactory.utils import absolutify, absolutify_many
+
+
+# The most URLs the sitemap protocol allows in one file.
+MAX_URLS = 50000
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def locale_urls(views, locales=None, batch_size=1000):
+    """
+    Yield the absolute URL of every view in every locale.
+
+    ``views`` is a callable returning an iterable of ``(viewname, args,
+    kwargs)``. It is called once per locale, so it can stream from the
+    database. ``locales`` defaults to the ones in LANGUAGE_URL_MAP.
+
+    URLs are reversed ``batch_size`` at a time with the locale's prefix in
+    place, and the previous prefix is back before any of them are yielded.
+    """
+    if locales is None:
+        locales = sorted(settings.LANGUAGE_URL_MAP.values())
+    for locale in locales:
+        prefixer = locale_prefixer(locale)
+        for batch in _batches(views(), batch_size):
+            with url_prefix(prefixer):
+                paths = [reverse(viewname, args=args, kwargs=kwargs)
+                         for viewname, args, kwargs in batch]
+            for url in absolutify_many(paths):
+                yield url
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class SitemapWriter(object):
+    """
+    Writes URLs to ``<name>-<n>.xml`` files of at most ``max_urls`` URLs in
+    ``directory`` as they are added, and ``<name>.xml``, an index of those
+    files, on close(). With ``gzip`` every file is gzipped and gets a .gz
+    extension.
+
+    Only the file being written is open, so memory use stays the same however
+    many URLs there are. Files are written under a temporary name and renamed
+    when complete. ``base_url`` is the URL the files are served from; it
+    defaults to the root of the site.
+    """
+
+    def __init__(self, directory, base_url=None, name='sitemap',
+                 max_urls=MAX_URLS, gzip=False):
+        self.directory = directory
+        self.base_url = base_url if base_url is not None else absolutify('/')
+        self.name = name
+        self.max_urls = max_urls
+        self.gzip = gzip
+        self.sitemaps = []
+        self._file = None
+        self._path = None
+        self._count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            self._file.close()
+            os.remove(self._path + '.tmp')
+
+    def add(self, url, lastmod=None, changefreq=None, priority=None):
+        if self._file is None or self._count >= self.max_urls:
+            self._close_sitemap()
+            self._file, self._path = self._open(
+                '%s-%s.xml' % (self.name, len(self.sitemaps) + 1))
+            self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                             '<urlset xmlns="%s">\n' % XMLNS)
+        entry = ['<url><loc>', escape(url), '</loc>']
+        if lastmod is not None:
+            if hasattr(lastmod, 'isoformat'):
+                lastmod = lastmod.isoformat()
+            entry.extend(['<lastmod>', lastmod, '</lastmod>'])
+        if changefreq is not None:
+            entry.extend(['<changefreq>', changefreq, '</changefreq>'])
+        if priority is not None:
+            entry.extend(['<priority>', str(priority), '</priority>'])
+        entry.append('</url>\n')
+        self._file.write(smart_str(''.join(entry)))
+        self._count += 1
+
+    def extend(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def close(self):
+        """Finish the last sitemap, write the index and return its path."""
+        self._close_sitemap()
+        index, path = self._open('%s.xml' % self.name)
+        index.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<sitemapindex xmlns="%s">\n' % XMLNS)
+        for filename in self.sitemaps:
+            index.write('<sitemap><loc>%s</loc></sitemap>\n' %
+                        escape(smart_str(self.base_url + filename)))
+        index.write('</sitemapindex>\n')
+        self._finish(index, path)
+        return path
+
+    def _open(self, filename):
+        """Return a file to write ``filename`` to, and its final path."""
+        if self.gzip:
+            filename += '.gz'
+        path = os.path.join(self.directory, filename)
+        opener = gzip_module.GzipFile if self.gzip else open
+        return opener(path + '.tmp', 'wb'), path
+
+    def _finish(self, f, path):
+        f.close()
+        os.rename(path + '.tmp', path)
+
+    def _close_sitemap(self):
+        if self._file is not None:
+            self._file.write('</urlset>\n')
+            self._finish(self._file, self._path)
+            self.sitemaps.append(os.path.basename(self._path))
+            self._file = self._path = None
+            self._count = 0
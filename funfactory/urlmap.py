@@ -0,0 +1,109 @@
+"""
+Localized URLs rendered ahead of time, for code that needs the URL of a view
+in every locale (templates, CDN purge jobs) without calling reverse().
+
+Build a map with the prerender_urls management command, or::
+
+    urls = render_urls([('home', (), {}), ('items.detail', (1,), {})],
+                       settings.PROD_LANGUAGES)
+    write_url_map('urls.json', urls)
+
+and look URLs up with::
+
+    URLMap.load('urls.json').get('items.detail', args=(1,), locale='de')
+"""
+import gzip
+import json
+from multiprocessing import Pool
+
+from funfactory.urlresolvers import (get_url_prefix, locale_prefixer,
+                                     reverse, url_prefix)
+
+
+def view_key(viewname, args=None, kwargs=None):
+    """Return the key of a view and its arguments in a URL map."""
+    return json.dumps([viewname, list(args or ()), kwargs or {}],
+                      sort_keys=True, separators=(',', ':'))
+
+
+def _render_chunk(chunk):
+    locale, views = chunk
+    with url_prefix(locale_prefixer(locale)):
+        return [reverse(viewname, args=args, kwargs=kwargs)
+                for viewname, args, kwargs in views]
+
+
+def render_urls(views, locales, processes=None, chunk_size=500):
+    """
+    Reverse every ``(viewname, args, kwargs)`` in ``views`` for every locale
+    and return ``{'locales': [...], 'urls': {view key: [URL per locale]}}``.
+
+    Each locale's views are split in chunks of ``chunk_size`` and spread over
+    ``processes`` processes (default: one per CPU). With ``processes=1``
+    everything happens in this process.
+    """
+    views = list(views)
+    locales = list(locales)
+    chunks = [(locale, views[i:i + chunk_size])
+              for locale in locales
+              for i in range(0, len(views), chunk_size)]
+    if processes == 1:
+        results = map(_render_chunk, chunks)
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(_render_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+    urls = dict((view_key(*view), [None] * len(locales)) for view in views)
+    columns = dict((locale, i) for i, locale in enumerate(locales))
+    for (locale, chunk), rendered in zip(chunks, results):
+        column = columns[locale]
+        for view, url in zip(chunk, rendered):
+            urls[view_key(*view)][column] = url
+    return {'locales': locales, 'urls': urls}
+
+
+def write_url_map(path, url_map):
+    """Write a map from render_urls() as compact JSON, gzipped for .gz."""
+    f = gzip.open(path, 'wb') if path.endswith('.gz') else open(path, 'wb')
+    try:
+        json.dump(url_map, f, separators=(',', ':'))
+    finally:
+        f.close()
+
+
+class URLMap(object):
+    """Looks up URLs in a map from render_urls()."""
+
+    def __init__(self, url_map):
+        self.locales = url_map['locales']
+        self.urls = url_map['urls']
+        self._columns = dict((locale, i)
+                             for i, locale in enumerate(self.locales))
+
+    @classmethod
+    def load(cls, path):
+        f = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+        try:
+            return cls(json.load(f))
+        finally:
+            f.close()
+
+    def get(self, viewname, args=None, kwargs=None, locale=None):
+        """
+        Return the URL of a view in ``locale`` (default: the locale of the
+        current URL prefix), or None if it isn't in the map.
+        """
+        if locale is None:
+            prefixer = get_url_prefix()
+            if prefixer is None:
+                return None
+            locale = prefixer.locale or prefixer.get_language()
+        urls = self.urls.get(view_key(viewname, args, kwargs))
+        column = self._columns.get(locale)
+        if urls is None or column is None:
+            return None
+        return urls[column]
@@ -1,30 +1,138 @@
+from contextlib import contextmanager
 from threading import local
+import weakref
 
 from django.conf import settings
-from django.core.urlresolvers import reverse as django_reverse
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import (get_script_prefix, get_urlconf,
+                                      reverse as django_reverse)
+from django.http import HttpRequest
 from django.utils.encoding import iri_to_uri
 from django.utils.functional import lazy
 from django.utils.translation.trans_real import parse_accept_lang_header
 
+from .manage import import_mod_by_name
+from .utils import LRUCache, setting_changed
 
-# Thread-local storage for URL prefixes. Access with (get|set)_url_prefix.
-_local = local()
+
+# Where the current request's Prefixer is kept. An instance of the class
+# named by settings.FF_URL_PREFIX_STORAGE, created on first use. Access with
+# (get|set)_url_prefix.
+_prefix_storage = None
+
+# Lookup tables derived from settings.LANGUAGE_URL_MAP. Built on first use and
+# dropped whenever one of the settings it depends on changes.
+_locale_index = None
+_LOCALE_SETTINGS = ('LANGUAGE_URL_MAP', 'CANONICAL_LOCALES', 'DEV',
+                    'DEV_LANGUAGES', 'PROD_LANGUAGES')
+
+# Negotiated locales keyed on the raw Accept-Language header. Sized by
+# settings.FF_ACCEPT_LANGUAGE_CACHE_SIZE.
+_best_language_cache = None
+_MISSING = object()
+
+# Results of reverse() keyed on its arguments plus the script prefix and
+# locale in effect. Sized by settings.FF_REVERSE_CACHE_SIZE; off by default.
+_reverse_cache = None
+
+
+class ThreadLocalPrefixStorage(object):
+    """Keeps one URL prefix per thread. This is the default."""
+
+    def __init__(self):
+        self._local = local()
+
+    def get(self):
+        return getattr(self._local, 'prefix', None)
+
+    def set(self, prefix):
+        self._local.prefix = prefix
+
+
+class GreenletPrefixStorage(object):
+    """Keeps one URL prefix per greenlet, for gevent or eventlet workers."""
+
+    def __init__(self):
+        from greenlet import getcurrent
+        self._getcurrent = getcurrent
+        self._prefixes = weakref.WeakKeyDictionary()
+
+    def get(self):
+        return self._prefixes.get(self._getcurrent())
+
+    def set(self, prefix):
+        if prefix is None:
+            self._prefixes.pop(self._getcurrent(), None)
+        else:
+            self._prefixes[self._getcurrent()] = prefix
+
+
+def _get_prefix_storage():
+    global _prefix_storage
+    storage = _prefix_storage
+    if storage is None:
+        name = getattr(settings, 'FF_URL_PREFIX_STORAGE',
+                       'funfactory.urlresolvers.ThreadLocalPrefixStorage')
+        try:
+            storage = import_mod_by_name(name)()
+        except (ImportError, AttributeError) as e:
+            raise ImproperlyConfigured('Error loading FF_URL_PREFIX_STORAGE '
+                                       '%s: "%s"' % (name, e))
+        _prefix_storage = storage
+    return storage
 
 
 def set_url_prefix(prefix):
-    """Set the ``prefix`` for the current thread."""
-    _local.prefix = prefix
+    """Set the ``prefix`` for the current request."""
+    _get_prefix_storage().set(prefix)
 
 
 def get_url_prefix():
-    """Get the prefix for the current thread, or None."""
-    return getattr(_local, 'prefix', None)
+    """Get the prefix for the current request, or None."""
+    return _get_prefix_storage().get()
+
+
+@contextmanager
+def url_prefix(prefix):
+    """Use ``prefix`` for reverse() inside the block, e.g. outside a request."""
+    old = get_url_prefix()
+    set_url_prefix(prefix)
+    try:
+        yield prefix
+    finally:
+        set_url_prefix(old)
+
+
+def locale_prefixer(locale, script_name=''):
+    """Return a Prefixer for ``locale`` that doesn't need a request."""
+    request = HttpRequest()
+    request.path_info = '/%s/' % locale
+    request.META['SCRIPT_NAME'] = script_name
+    prefixer = Prefixer(request)
+    prefixer.locale = locale
+    return prefixer
 
 
 def reverse(viewname, urlconf=None, args=None, kwargs=None, prefix=None):
     """Wraps Django's reverse to prepend the correct locale."""
     prefixer = get_url_prefix()
 
+    cache = _get_reverse_cache()
+    if cache.maxsize:
+        key = _reverse_cache_key(prefixer, viewname, urlconf, args, kwargs,
+                                 prefix)
+        if key is not None:
+            url = cache.get(key)
+            if url is None:
+                url = _reverse(prefixer, viewname, urlconf, args, kwargs,
+                               prefix)
+                cache.set(key, url)
+            return url
+
+    return _reverse(prefixer, viewname, urlconf, args, kwargs, prefix)
+
+
+def _reverse(prefixer, viewname, urlconf, args, kwargs, prefix):
     if prefixer:
         prefix = prefix or '/'
     url = django_reverse(viewname, urlconf, args, kwargs, prefix)
@@ -38,10 +146,134 @@ def reverse(viewname, urlconf=None, args=None, kwargs=None, prefix=None):
 reverse_lazy = lazy(reverse, str)
 
 
+def _get_reverse_cache():
+    global _reverse_cache
+    cache = _reverse_cache
+    if cache is None:
+        size = getattr(settings, 'FF_REVERSE_CACHE_SIZE', 0)
+        cache = _reverse_cache = LRUCache(size)
+    return cache
+
+
+def _reverse_cache_key(prefixer, viewname, urlconf, args, kwargs, prefix):
+    """Return a hashable key for a reverse() call, or None if there isn't one."""
+    if prefixer:
+        script_name = prefixer.request.META['SCRIPT_NAME']
+        locale = prefixer.locale or prefixer.get_language()
+    else:
+        script_name = prefix or get_script_prefix()
+        locale = None
+    key = (viewname, urlconf or get_urlconf() or settings.ROOT_URLCONF,
+           tuple(args or ()), tuple(sorted((kwargs or {}).items())),
+           prefix, script_name, locale)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def clear_reverse_cache():
+    """Forget every URL memoized by reverse()."""
+    _get_reverse_cache().clear()
+
+
+class LocaleIndex(object):
+    """
+    Precomputed lookups for a ``LANGUAGE_URL_MAP``.
+
+    ``exact`` maps lowercase locale codes to locales, ``prefixes`` maps the
+    language part of a code (``es`` for ``es-AR``) to every matching locale in
+    map order and ``first`` maps it to the first of those. ``accept`` is what
+    Accept-Language values are matched against: ``exact`` plus
+    ``canonical_locales`` plus the first locale for any short code still
+    missing.
+    """
+
+    def __init__(self, language_url_map, canonical_locales=None):
+        self.exact = {}
+        prefixes = {}
+        for key, locale in language_url_map.items():
+            self.exact[key] = locale
+            prefixes.setdefault(key.split('-', 1)[0], []).append(locale)
+        self.prefixes = dict((k, tuple(v)) for k, v in prefixes.items())
+        self.first = dict((k, v[0]) for k, v in self.prefixes.items())
+
+        # This will automatically map en to en-GB (not en-US), es to es-AR
+        # (not es-ES), etc. in alphabetical order. To override this behavior,
+        # explicitly define a preferred locale map with the CANONICAL_LOCALES
+        # setting.
+        self.accept = dict(self.exact)
+        self.accept.update(canonical_locales or {})
+        for key, locale in language_url_map.items():
+            short = key.split('-')[0]
+            if short not in self.accept:
+                self.accept[short] = locale
+
+
+def get_locale_index():
+    """Return the LocaleIndex for the current settings."""
+    global _locale_index
+    index = _locale_index
+    if index is None:
+        index = _locale_index = LocaleIndex(settings.LANGUAGE_URL_MAP,
+                                            settings.CANONICAL_LOCALES)
+    return index
+
+
+def _get_best_language_cache():
+    global _best_language_cache
+    cache = _best_language_cache
+    if cache is None:
+        size = getattr(settings, 'FF_ACCEPT_LANGUAGE_CACHE_SIZE', 1000)
+        cache = _best_language_cache = LRUCache(size)
+    return cache
+
+
+def best_language_cache_info():
+    """Return hit/miss counters for the Accept-Language negotiation cache."""
+    return _get_best_language_cache().info()
+
+
+def _reset_locale_index(**kwargs):
+    global _locale_index, _best_language_cache
+    if kwargs['setting'] in _LOCALE_SETTINGS:
+        _locale_index = None
+        _best_language_cache = None
+    elif kwargs['setting'] == 'FF_ACCEPT_LANGUAGE_CACHE_SIZE':
+        _best_language_cache = None
+
+
+def _reset_prefix_storage(**kwargs):
+    global _prefix_storage
+    if kwargs['setting'] == 'FF_URL_PREFIX_STORAGE':
+        _prefix_storage = None
+
+
+def _reset_reverse_cache(**kwargs):
+    global _reverse_cache
+    if kwargs['setting'] == 'FF_REVERSE_CACHE_SIZE':
+        _reverse_cache = None
+    elif kwargs['setting'] in _LOCALE_SETTINGS + ('ROOT_URLCONF',):
+        clear_reverse_cache()
+
+setting_changed.connect(_reset_locale_index)
+setting_changed.connect(_reset_reverse_cache)
+setting_changed.connect(_reset_prefix_storage)
+
+
+def get_language_header():
+    """
+    Return the name and META key of the request header locales are
+    negotiated from: settings.FF_LOCALE_VARY_HEADER, or Accept-Language.
+    """
+    name = getattr(settings, 'FF_LOCALE_VARY_HEADER', None) or 'Accept-Language'
+    return name, 'HTTP_' + name.upper().replace('-', '_')
+
+
 def find_supported(test):
-    return [settings.LANGUAGE_URL_MAP[x] for
-            x in settings.LANGUAGE_URL_MAP if
-            x.split('-', 1)[0] == test.lower().split('-', 1)[0]]
+    prefix = test.lower().split('-', 1)[0]
+    return list(get_locale_index().prefixes.get(prefix, ()))
 
 
 def split_path(path_):
@@ -56,22 +288,50 @@ def split_path(path_):
     first, _, rest = path.partition('/')
 
     lang = first.lower()
-    if lang in settings.LANGUAGE_URL_MAP:
-        return settings.LANGUAGE_URL_MAP[lang], rest
+    index = get_locale_index()
+    locale = (index.exact.get(lang) or
+              index.first.get(lang.split('-', 1)[0]))
+    if locale:
+        return locale, rest
     else:
-        supported = find_supported(first)
-        if len(supported):
-            return supported[0], rest
-        else:
-            return '', path
+        return '', path
 
 
 class Prefixer(object):
+    """
+    Works out the locale of a request and prefixes URLs with it.
+
+    Nothing is computed up front: the path is split the first time
+    ``locale`` or ``shortened_path`` is read and the user's language is
+    negotiated at most once, the first time it is needed.
+    """
 
     def __init__(self, request):
         self.request = request
-        split = split_path(request.path_info)
-        self.locale, self.shortened_path = split
+        self._path = request.path_info
+        self._split = None
+        self._language = None
+
+    def _get_split(self):
+        if self._split is None:
+            self._split = list(split_path(self._path))
+        return self._split
+
+    @property
+    def locale(self):
+        return self._get_split()[0]
+
+    @locale.setter
+    def locale(self, value):
+        self._get_split()[0] = value
+
+    @property
+    def shortened_path(self):
+        return self._get_split()[1]
+
+    @shortened_path.setter
+    def shortened_path(self, value):
+        self._get_split()[1] = value
 
     def get_language(self):
         """
@@ -79,28 +339,35 @@ class Prefixer(object):
         user's Accept-Language header to determine which is best. This
         mostly follows the RFCs but read bug 439568 for details.
         """
+        if self._language is None:
+            self._language = self._get_language()
+        return self._language
+
+    def _get_language(self):
         if 'lang' in self.request.GET:
             lang = self.request.GET['lang'].lower()
-            if lang in settings.LANGUAGE_URL_MAP:
-                return settings.LANGUAGE_URL_MAP[lang]
+            exact = get_locale_index().exact
+            if lang in exact:
+                return exact[lang]
 
-        if self.request.META.get('HTTP_ACCEPT_LANGUAGE'):
-            best = self.get_best_language(
-                self.request.META['HTTP_ACCEPT_LANGUAGE'])
+        accept_lang = self.request.META.get(get_language_header()[1])
+        if accept_lang:
+            best = self.get_best_language(accept_lang)
             if best:
                 return best
         return settings.LANGUAGE_CODE
 
     def get_best_language(self, accept_lang):
         """Given an Accept-Language header, return the best-matching language."""
-        LUM = settings.LANGUAGE_URL_MAP
-        langs = dict(LUM.items() + settings.CANONICAL_LOCALES.items())
-        # Add missing short locales to the list. This will automatically map
-        # en to en-GB (not en-US), es to es-AR (not es-ES), etc. in alphabetical
-        # order. To override this behavior, explicitly define a preferred locale
-        # map with the CANONICAL_LOCALES setting.
-        langs.update((k.split('-')[0], v) for k, v in LUM.items() if
-                     k.split('-')[0] not in langs)
+        cache = _get_best_language_cache()
+        best = cache.get(accept_lang, _MISSING)
+        if best is _MISSING:
+            best = self._negotiate(accept_lang)
+            cache.set(accept_lang, best)
+        return best
+
+    def _negotiate(self, accept_lang):
+        langs = get_locale_index().accept
         try:
             ranked = parse_accept_lang_header(accept_lang)
         except ValueError:  # see https://code.djangoproject.com/ticket/21078
@@ -1,23 +1,159 @@
 import logging
+import sys
+import threading
 
 from django.conf import settings
 
+# Re-exported for the modules that cache values derived from settings.
+try:
+    from django.core.signals import setting_changed  # noqa
+except ImportError:
+    # Django < 1.8 only sends it from the test machinery. Importing that would
+    # load the test client, test cases and more in production, so use a
+    # signal of our own that the test one is forwarded to once something
+    # imports it, whenever that is.
+    from django.dispatch import Signal
+    setting_changed = Signal(providing_args=['setting', 'value'])
+
+    def _forward_setting_changed(sender, **kwargs):
+        kwargs.pop('signal', None)
+        setting_changed.send(sender=sender, **kwargs)
+
+    class _TestSignalHook(object):
+        """An import hook that connects to django.test.signals on import."""
+        name = 'django.test.signals'
+
+        def find_module(self, fullname, path=None):
+            if fullname == self.name:
+                return self
+
+        def load_module(self, fullname):
+            sys.meta_path.remove(self)
+            module = sys.modules.get(fullname)
+            if module is None:
+                __import__(fullname)
+                module = sys.modules[fullname]
+            module.setting_changed.connect(_forward_setting_changed)
+            return module
+
+    if _TestSignalHook.name in sys.modules:
+        sys.modules[_TestSignalHook.name].setting_changed.connect(
+            _forward_setting_changed)
+    else:
+        sys.meta_path.insert(0, _TestSignalHook())
+
 
 log = logging.getLogger('funfactory')
 
 
+class LRUCache(object):
+    """
+    A thread-safe mapping that keeps at most ``maxsize`` of the most recently
+    used entries and counts hits and misses. A ``maxsize`` of 0 disables it.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._links = {}
+        # Circular doubly linked list of [prev, next, key, value] links, from
+        # least (root[1]) to most (root[0]) recently used.
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._move_to_end(link)
+            return link[3]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                link[3] = value
+                self._move_to_end(link)
+                return
+            root = self._root
+            if len(self._links) >= self.maxsize:
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del self._links[oldest[2]]
+            last = root[0]
+            link = [last, root, key, value]
+            last[1] = root[0] = self._links[key] = link
+
+    def clear(self):
+        with self._lock:
+            self._links.clear()
+            self._root[:] = [self._root, self._root, None, None]
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Return the hit/miss counters and current size as a dict."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._links), 'maxsize': self.maxsize}
+
+    def _move_to_end(self, link):
+        prev, next_ = link[0], link[1]
+        prev[1] = next_
+        next_[0] = prev
+        root = self._root
+        last = root[0]
+        link[0] = last
+        link[1] = root
+        last[1] = root[0] = link
+
+
+_SITE_URL_SETTINGS = ('SITE_URL', 'PROTOCOL', 'DOMAIN', 'PORT')
+_site_url = None
+
+
+def get_site_url():
+    """Return SITE_URL, or the site URL built from PROTOCOL, DOMAIN and PORT."""
+    global _site_url
+    site_url = _site_url
+    if site_url is None:
+        site_url = getattr(settings, 'SITE_URL', False)
+
+        # If we don't define it explicitly
+        if not site_url:
+            protocol = settings.PROTOCOL
+            hostname = settings.DOMAIN
+            port = settings.PORT
+            if (protocol, port) in (('https://', 443), ('http://', 80)):
+                site_url = ''.join(map(str, (protocol, hostname)))
+            else:
+                site_url = ''.join(map(str, (protocol, hostname, ':', port)))
+        _site_url = site_url
+    return site_url
+
+
+def _reset_site_url(**kwargs):
+    global _site_url
+    if kwargs['setting'] in _SITE_URL_SETTINGS:
+        _site_url = None
+
+setting_changed.connect(_reset_site_url)
+
+
 def absolutify(url):
     """Takes a URL and prepends the SITE_URL"""
-    site_url = getattr(settings, 'SITE_URL', False)
-
-    # If we don't define it explicitly
-    if not site_url:
-        protocol = settings.PROTOCOL
-        hostname = settings.DOMAIN
-        port = settings.PORT
-        if (protocol, port) in (('https://', 443), ('http://', 80)):
-            site_url = ''.join(map(str, (protocol, hostname)))
-        else:
-            site_url = ''.join(map(str, (protocol, hostname, ':', port)))
-
-    return site_url + url
+    return (_site_url or get_site_url()) + url
+
+
+def absolutify_many(urls):
+    """Like absolutify, for an iterable of URLs. Returns a generator."""
+    site_url = get_site_url()
+    return (site_url + url for url in urls)
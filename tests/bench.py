@@ -0,0 +1,234 @@
+"""
+Micro-benchmarks for the code funfactory runs on every request.
+
+Runs against in-memory settings, so unlike the test suite it needs neither a
+playdoh clone nor a database::
+
+    python tests/bench.py -o before.json
+    # ...hack hack hack...
+    python tests/bench.py -o after.json --compare before.json
+
+Results are written as JSON with the best per-call time (in microseconds) of
+each benchmark.
+"""
+import json
+import optparse
+import os
+import platform
+import random
+import sys
+from timeit import default_timer
+
+
+__test__ = False  # Not a test to be collected by Nose.
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Roughly the locales a large Mozilla site ships.
+LOCALES = (
+    'en-US', 'ach', 'af', 'an', 'ar', 'as', 'ast', 'be', 'bg', 'bn-BD',
+    'bn-IN', 'br', 'bs', 'ca', 'cs', 'csb', 'cy', 'da', 'de', 'el', 'en-GB',
+    'en-ZA', 'eo', 'es-AR', 'es-CL', 'es-ES', 'es-MX', 'et', 'eu', 'fa', 'ff',
+    'fi', 'fr', 'fy-NL', 'ga-IE', 'gd', 'gl', 'gu-IN', 'he', 'hi-IN', 'hr',
+    'hu', 'hy-AM', 'id', 'is', 'it', 'ja', 'kk', 'km', 'kn', 'ko', 'ku',
+    'lij', 'lt', 'lv', 'mai', 'mk', 'ml', 'mr', 'ms', 'my', 'nb-NO', 'nl',
+    'nn-NO', 'or', 'pa-IN', 'pl', 'pt-BR', 'pt-PT', 'rm', 'ro', 'ru', 'si',
+    'sk', 'sl', 'son', 'sq', 'sr', 'sv-SE', 'ta', 'te', 'th', 'tr', 'uk',
+    'ur', 'vi', 'xh', 'zh-CN', 'zh-TW', 'zu',
+)
+
+PATHS = (
+    '/', '/en-US/', '/de/about/', '/fr/firefox/new/', '/pt-BR/items/12/',
+    '/about/', '/api/v1/items/', '/robots.txt', '/static/css/site.css',
+    '/media/img/logo.png', '/admin/', '/en-us/items/3/', '/es/contribute/',
+)
+
+urlpatterns = None
+
+
+def view(request, *args):
+    pass
+
+
+def accept_language_corpus(size, distinct=300, seed=0):
+    """
+    A list of ``size`` Accept-Language headers drawn from ``distinct`` values
+    with a heavy-tailed (Zipf-like) distribution, like real traffic.
+    """
+    rnd = random.Random(seed)
+    bases = list(LOCALES) + ['en', 'de-DE', 'fr-FR', 'es', 'pt', 'zh',
+                             'xx-YY']
+    values = []
+    while len(values) < distinct:
+        langs = rnd.sample(bases, rnd.randint(1, 4))
+        header = ','.join('%s;q=%.1f' % (l, 1 - i / 10.0) if i else l
+                          for i, l in enumerate(langs))
+        if header not in values:
+            values.append(header)
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    total = sum(weights)
+    corpus = []
+    for _ in range(size):
+        point = rnd.random() * total
+        for value, weight in zip(values, weights):
+            point -= weight
+            if point <= 0:
+                break
+        corpus.append(value)
+    return corpus
+
+
+def configure(locales):
+    global urlpatterns
+    sys.path.insert(0, ROOT)
+    from django.conf import settings
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY='benchmarks',
+        ROOT_URLCONF=__name__,
+        INSTALLED_APPS=('funfactory',),
+        TEMPLATE_DIRS=(),
+        USE_I18N=True,
+        USE_L10N=True,
+        LANGUAGE_CODE='en-US',
+        TEXT_DOMAIN='messages',
+        STANDALONE_DOMAINS=['messages', 'javascript'],
+        DEV=False,
+        PROD_LANGUAGES=locales,
+        LANGUAGE_URL_MAP=dict((l.lower(), l) for l in locales),
+        CANONICAL_LOCALES={'en': 'en-US'},
+        SUPPORTED_NONLOCALES=['media', 'static', 'admin'],
+        SITE_URL='',
+        PROTOCOL='https://',
+        DOMAIN='example.com',
+        PORT=443,
+    )
+    from django.conf.urls.defaults import patterns, url
+    urlpatterns = patterns('',
+        url(r'^$', view, name='bench.home'),
+        url(r'^items/(\d+)/$', view, name='bench.item'),
+    )
+
+
+def benchmarks(headers):
+    """Yield (name, function, number of calls the function makes)."""
+    from django.conf import settings
+    from django.test.client import RequestFactory
+    from funfactory import urlresolvers, utils
+    from funfactory.helpers import urlparams
+    from funfactory.middleware import LocaleURLMiddleware
+
+    rf = RequestFactory()
+    requests = [rf.get(path, HTTP_ACCEPT_LANGUAGE=header)
+                for path, header in zip(PATHS * (len(headers) // len(PATHS)),
+                                        headers)]
+
+    middleware = LocaleURLMiddleware()
+
+    def process_request():
+        for request in requests:
+            request.path_info = request.path
+            middleware.process_request(request)
+    yield 'LocaleURLMiddleware.process_request', process_request, len(requests)
+
+    def split_path():
+        for request in requests:
+            urlresolvers.split_path(request.path)
+    yield 'split_path', split_path, len(requests)
+
+    prefixer = urlresolvers.Prefixer(rf.get('/'))
+
+    def get_best_language():
+        for header in headers:
+            prefixer.get_best_language(header)
+    yield 'Prefixer.get_best_language', get_best_language, len(headers)
+
+    prefixers = [urlresolvers.Prefixer(rf.get('/%s/' % l))
+                 for l in settings.PROD_LANGUAGES]
+
+    def reverse():
+        for prefixer in prefixers:
+            urlresolvers.set_url_prefix(prefixer)
+            for i in range(10):
+                urlresolvers.reverse('bench.item', args=[i])
+            urlresolvers.reverse('bench.home')
+        urlresolvers.set_url_prefix(None)
+    yield 'reverse', reverse, len(prefixers) * 11
+
+    def url_params():
+        for i in range(100):
+            urlparams('/search/', page=i)
+            urlparams('/search/?q=firefox&sort=new', page=i, sort=None)
+            urlparams('/search/?q=firefox#results', hash='top', q=u'f\xfc')
+    yield 'urlparams', url_params, 300
+
+    def absolutify():
+        for i in range(1000):
+            utils.absolutify('/en-US/items/1/')
+    yield 'absolutify', absolutify, 1000
+
+
+def run(repeat, headers):
+    results = {}
+    for name, func, calls in benchmarks(headers):
+        func()  # Warm up caches and lazy imports.
+        timings = []
+        for _ in range(repeat):
+            start = default_timer()
+            func()
+            timings.append(default_timer() - start)
+        results[name] = {
+            'calls': calls,
+            'best_us': min(timings) / calls * 1e6,
+            'mean_us': sum(timings) / len(timings) / calls * 1e6,
+        }
+    return results
+
+
+def main():
+    ps = optparse.OptionParser(usage='%prog [options]\n' + __doc__)
+    ps.add_option('-o', '--output', help='Write JSON results to this file '
+                                         'instead of stdout.')
+    ps.add_option('--compare', help='JSON results of a previous run to '
+                                    'compare against.')
+    ps.add_option('--locales', type='int', default=len(LOCALES),
+                  help='Number of supported locales. Default: %default')
+    ps.add_option('--headers', type='int', default=2000,
+                  help='Number of Accept-Language headers to replay. '
+                       'Default: %default')
+    ps.add_option('--repeat', type='int', default=5,
+                  help='Runs per benchmark; the best one counts. '
+                       'Default: %default')
+    (options, args) = ps.parse_args()
+
+    configure(LOCALES[:options.locales])
+    import django
+    from funfactory import __version__
+
+    report = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'funfactory': __version__,
+        'locales': options.locales,
+        'results': run(options.repeat,
+                       accept_language_corpus(options.headers)),
+    }
+    out = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print(out)
+
+    if options.compare:
+        with open(options.compare) as f:
+            before = json.load(f)['results']
+        for name, result in sorted(report['results'].items()):
+            if name in before:
+                sys.stderr.write('%-40s %9.2fus -> %9.2fus (%+.1f%%)\n' % (
+                    name, before[name]['best_us'], result['best_us'],
+                    (result['best_us'] / before[name]['best_us'] - 1) * 100))
+
+
+if __name__ == '__main__':
+    main()
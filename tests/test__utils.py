@@ -1,30 +1,83 @@
+import sys
+
 from django.conf import settings
 
-from mock import patch
-from nose.tools import eq_
-from django.test import TestCase
+from nose.tools import eq_, ok_
+from django.test import signals, TestCase
+from django.test.utils import override_settings
 
 import funfactory.utils as utils
 
 
-@patch.object(settings, 'DOMAIN', 'test.mo.com')
+@override_settings(DOMAIN='test.mo.com')
 class AbsolutifyTests(TestCase):
     ABS_PATH = '/some/absolute/path'
 
-    @patch.object(settings, 'SITE_URL', 'http://testserver')
+    @override_settings(SITE_URL='http://testserver')
     def test_basic(self):
         url = utils.absolutify(AbsolutifyTests.ABS_PATH)
         eq_('%s/some/absolute/path' % settings.SITE_URL, url)
 
-    @patch.object(settings, 'PROTOCOL', 'https://')
-    @patch.object(settings, 'PORT', 443)
-    @patch.object(settings, 'SITE_URL', 'http://testserver')
+    @override_settings(PROTOCOL='https://', PORT=443,
+                       SITE_URL='http://testserver')
     def test_https(self):
         url = utils.absolutify(AbsolutifyTests.ABS_PATH)
         eq_('%s/some/absolute/path' % settings.SITE_URL, url)
 
-    @patch.object(settings, 'SITE_URL', '')
-    @patch.object(settings, 'PORT', 8009)
+    @override_settings(SITE_URL='', PORT=8009)
     def test_with_port(self):
         url = utils.absolutify(AbsolutifyTests.ABS_PATH)
         eq_('http://test.mo.com:8009/some/absolute/path', url)
+
+    @override_settings(SITE_URL='', PROTOCOL='http://', PORT=80)
+    def test_site_url_reset(self):
+        eq_(utils.absolutify('/'), 'http://test.mo.com/')
+        with override_settings(PORT=8009):
+            eq_(utils.absolutify('/'), 'http://test.mo.com:8009/')
+        eq_(utils.absolutify('/'), 'http://test.mo.com/')
+
+    @override_settings(SITE_URL='http://testserver')
+    def test_absolutify_many(self):
+        eq_(list(utils.absolutify_many(['/a', '/b'])),
+            ['http://testserver/a', 'http://testserver/b'])
+
+
+class LRUCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = utils.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        eq_(cache.get('a'), 1)
+        cache.set('c', 3)
+        eq_(cache.get('b'), None)
+        eq_(cache.get('a'), 1)
+        eq_(cache.get('c'), 3)
+        eq_(cache.info(), {'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2})
+
+    def test_disabled(self):
+        cache = utils.LRUCache(0)
+        cache.set('a', 1)
+        eq_(cache.get('a', 'missing'), 'missing')
+        eq_(len(cache), 0)
+
+
+class SettingChangedTests(TestCase):
+
+    @override_settings(SITE_URL='http://testserver')
+    def test_forwarded_once_imported(self):
+        eq_(utils.get_site_url(), 'http://testserver')
+        # As if funfactory.utils was imported before django.test.
+        signals.setting_changed.disconnect(utils._forward_setting_changed)
+        try:
+            with override_settings(SITE_URL='http://example.com'):
+                eq_(utils.get_site_url(), 'http://testserver')
+            hook = utils._TestSignalHook()
+            sys.meta_path.insert(0, hook)
+            ok_(hook.find_module('django.test.signals') is hook)
+            eq_(hook.load_module('django.test.signals'), signals)
+            ok_(hook not in sys.meta_path)
+        finally:
+            signals.setting_changed.connect(utils._forward_setting_changed)
+        with override_settings(SITE_URL='http://example.com'):
+            eq_(utils.get_site_url(), 'http://example.com')
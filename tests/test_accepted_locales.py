@@ -2,6 +2,7 @@ import os
 import shutil
 
 from django.conf import settings
+from django.test.utils import override_settings
 import test_utils
 
 from funfactory.manage import path
@@ -68,27 +69,26 @@ class AcceptedLocalesTest(test_utils.TestCase):
                 settings.DEV_LANGUAGES == ['fr', 'en-US']), \
                 'DEV_LANGUAGES do not correspond to the contents of locale/.'
 
+    # simulate the successful result of the DEV_LANGUAGES discovery
+    # defined in settings.
+    @override_settings(DEV=True, DEV_LANGUAGES=['en-US', 'fr'])
     def test_dev_languages(self):
         """Test the accepted locales on dev instances.
 
         On dev instances, allow locales defined in DEV_LANGUAGES.
 
         """
-        settings.DEV = True
-        # simulate the successful result of the DEV_LANGUAGES list 
-        # comprehension defined in settings.
-        settings.DEV_LANGUAGES = ['en-US', 'fr']
         assert settings.LANGUAGE_URL_MAP == {'en-us': 'en-US', 'fr': 'fr'}, \
                ('DEV is True, but DEV_LANGUAGES are not used to define the '
                 'allowed locales.')
 
+    @override_settings(DEV=False, PROD_LANGUAGES=('en-US',))
     def test_prod_languages(self):
         """Test the accepted locales on prod instances.
 
         On stage/prod instances, allow locales defined in PROD_LANGUAGES.
 
         """
-        settings.DEV = False
         assert settings.LANGUAGE_URL_MAP == {'en-us': 'en-US'}, \
                ('DEV is False, but PROD_LANGUAGES are not used to define the '
                 'allowed locales.')
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import jinja2
+from mock import patch
+from nose.tools import eq_, ok_, raises
+
+from funfactory.bytecode_cache import (DjangoBytecodeCache,
+                                       FileSystemBytecodeCache)
+from funfactory.settings_base import JINJA_CONFIG
+
+
+class BytecodeCacheTests(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.template = os.path.join(self.dir, 'base.html')
+        with open(self.template, 'w') as f:
+            f.write('{{ 1 + 1 }}')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def env(self, bytecode_cache):
+        loader = jinja2.FileSystemLoader(self.dir)
+        return jinja2.Environment(loader=loader, cache_size=0,
+                                  bytecode_cache=bytecode_cache)
+
+    def test_filesystem_round_trip(self):
+        cache_dir = os.path.join(self.dir, 'cache')
+        cache = FileSystemBytecodeCache(cache_dir)
+        eq_(self.env(cache).get_template('base.html').render(), '2')
+        files = os.listdir(cache_dir)
+        eq_(len(files), 1)
+        ok_(not files[0].endswith('.tmp'))
+
+        with patch.object(cache, 'dump_bytecode') as dump_bytecode:
+            eq_(self.env(cache).get_template('base.html').render(), '2')
+            ok_(not dump_bytecode.called)
+
+    def test_default_directory(self):
+        with patch('tempfile.gettempdir', lambda: self.dir):
+            cache = FileSystemBytecodeCache()
+        eq_(os.path.dirname(cache.directory), self.dir)
+        eq_(os.stat(cache.directory).st_mode & 0777, 0700)
+        eq_(self.env(cache).get_template('base.html').render(), '2')
+
+    @raises(ImproperlyConfigured)
+    def test_shared_directory(self):
+        os.chmod(self.dir, 0777)
+        FileSystemBytecodeCache(self.dir)
+
+    def test_key_changes_with_mtime(self):
+        cache = FileSystemBytecodeCache(self.dir)
+        key = cache.get_cache_key('base.html', self.template)
+        eq_(cache.get_cache_key('base.html', self.template), key)
+        os.utime(self.template, (0, 0))
+        ok_(cache.get_cache_key('base.html', self.template) != key)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_django_cache(self):
+        cache = DjangoBytecodeCache()
+        eq_(self.env(cache).get_template('base.html').render(), '2')
+        with patch.object(cache, 'dump_bytecode') as dump_bytecode:
+            eq_(self.env(cache).get_template('base.html').render(), '2')
+            ok_(not dump_bytecode.called)
+
+    @override_settings(JINJA_BYTECODE_CACHE='django')
+    def test_jinja_config(self):
+        config = JINJA_CONFIG()
+        ok_(isinstance(config['bytecode_cache'], DjangoBytecodeCache))
+
+    @raises(ImproperlyConfigured)
+    @override_settings(JINJA_BYTECODE_CACHE='memcached')
+    def test_jinja_config_unknown_backend(self):
+        JINJA_CONFIG()
@@ -0,0 +1,279 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from mock import patch
+from nose.tools import eq_, ok_, raises
+
+from funfactory import cmd
+from funfactory.cmd import (clone_virtualenv, create_settings, install_reqs,
+                            python_abi, reqs_installed, run_tasks, Task,
+                            TEMPLATE_MARKER, venv_template)
+
+
+class TestRunTasks(unittest.TestCase):
+
+    def test_order(self):
+        ran = []
+        cloned = threading.Event()
+
+        def clone():
+            # venv runs meanwhile; clone only finishes once it has started.
+            ok_(cloned.wait(5) is not False)
+            ran.append('clone')
+
+        def venv():
+            ran.append('venv')
+            cloned.set()
+
+        timings = run_tasks([
+            Task('settings', lambda: ran.append('settings'), deps=['clone']),
+            Task('clone', clone),
+            Task('venv', venv),
+            Task('reqs', lambda: ran.append('reqs'), deps=['clone', 'venv']),
+        ])
+        eq_(ran[:2], ['venv', 'clone'])
+        eq_(sorted(ran[2:]), ['reqs', 'settings'])
+        eq_(sorted(timings), ['clone', 'reqs', 'settings', 'venv'])
+
+    def test_skip_done(self):
+        ran = []
+        timings = run_tasks([
+            Task('clone', lambda: ran.append('clone'), done=lambda: True),
+            Task('settings', lambda: ran.append('settings'), deps=['clone'],
+                 done=lambda: False),
+        ])
+        eq_(ran, ['settings'])
+        eq_(timings['clone'], None)
+
+    def test_marker(self):
+        ran = []
+        root = tempfile.mkdtemp()
+        try:
+            marker = os.path.join(root, '.git', 'funfactory-clone')
+
+            def fail():
+                ran.append('clone')
+                raise OSError('interrupted')
+
+            self.assertRaises(OSError, run_tasks,
+                              [Task('clone', fail, marker=marker)])
+            ok_(not os.path.exists(marker))
+            run_tasks([Task('clone', lambda: ran.append('clone'),
+                            marker=marker)])
+            ok_(os.path.exists(marker))
+            run_tasks([Task('clone', lambda: ran.append('clone'),
+                            marker=marker)])
+            eq_(ran, ['clone', 'clone'])
+        finally:
+            shutil.rmtree(root)
+
+    def test_error(self):
+        ran = []
+
+        def fail():
+            raise OSError('no git')
+
+        try:
+            run_tasks([Task('clone', fail),
+                       Task('settings', lambda: ran.append('settings'),
+                            deps=['clone']),
+                       Task('venv', lambda: ran.append('venv'))])
+        except OSError, exc:
+            eq_(str(exc), 'no git')
+        else:
+            raise AssertionError('OSError not raised')
+        eq_(ran, ['venv'])
+
+    @raises(ValueError)
+    def test_unknown_dep(self):
+        run_tasks([Task('settings', lambda: None, deps=['clone'])])
+
+    @raises(ValueError)
+    def test_cycle(self):
+        run_tasks([Task('a', lambda: None, deps=['b']),
+                   Task('b', lambda: None, deps=['a'])])
+
+
+# Logs its arguments and makes a wheel for `pip wheel`.
+FAKE_PIP = """#!/bin/sh
+echo "$@" >> %(log)s
+while [ $# -gt 0 ]; do
+    if [ "$1" = --wheel-dir ]; then
+        touch "$2/MySQL_python-1.2.3c1-cp27-none-linux_x86_64.whl"
+    fi
+    shift
+done
+"""
+
+
+class TestInstallReqs(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.venv = os.path.join(self.dir, 'venv')
+        os.makedirs(os.path.join(self.venv, 'bin'))
+        os.symlink(sys.executable, os.path.join(self.venv, 'bin', 'python'))
+        self.log = os.path.join(self.dir, 'pip.log')
+        pip = os.path.join(self.venv, 'bin', 'pip')
+        with open(pip, 'w') as f:
+            f.write(FAKE_PIP % {'log': self.log})
+        os.chmod(pip, 0755)
+        self.cache = os.path.join(self.dir, 'wheels')
+        cmd.verbose = False
+        os.makedirs(os.path.join(self.dir, 'requirements'))
+        self.write_reqs('MySQL-python==1.2.3c1\n')
+
+    def tearDown(self):
+        cmd.verbose = True
+        shutil.rmtree(self.dir)
+
+    def write_reqs(self, reqs):
+        with open(os.path.join(self.dir, 'requirements',
+                               'compiled.txt'), 'w') as f:
+            f.write(reqs)
+
+    def test_reqs_installed(self):
+        ok_(not reqs_installed(self.venv, self.dir))
+        install_reqs(self.venv, self.dir)
+        ok_(reqs_installed(self.venv, self.dir))
+        self.write_reqs('MySQL-python==1.2.3c1\npy-bcrypt==0.4\n')
+        ok_(not reqs_installed(self.venv, self.dir))
+
+    def pip_calls(self):
+        with open(self.log) as f:
+            return [line.split()[:2] for line in f]
+
+    def test_wheel_cache(self):
+        install_reqs(self.venv, self.dir, self.cache)
+        eq_(self.pip_calls(), [['install', '-q'], ['wheel', '-q'],
+                               ['install', '-q']])
+        wheel_dir = os.path.join(self.cache, python_abi(self.venv),
+                                 cmd.reqs_hash(self.dir))
+        eq_(os.listdir(wheel_dir),
+            ['MySQL_python-1.2.3c1-cp27-none-linux_x86_64.whl'])
+        eq_(os.listdir(os.path.dirname(wheel_dir)),
+            [os.path.basename(wheel_dir)])
+        with open(self.log) as f:
+            ok_('--no-index --find-links %s ' % wheel_dir
+                in f.readlines()[-1])
+
+        os.unlink(self.log)
+        install_reqs(self.venv, self.dir, self.cache, offline=True)
+        eq_(self.pip_calls(), [['install', '-q']])
+
+    @raises(EnvironmentError)
+    def test_offline_without_wheels(self):
+        install_reqs(self.venv, self.dir, self.cache, offline=True)
+
+
+class TestVenvTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.dir, 'templates')
+        os.makedirs(os.path.join(self.dir, 'requirements'))
+        with open(os.path.join(self.dir, 'requirements',
+                               'compiled.txt'), 'w') as f:
+            f.write('MySQL-python==1.2.3c1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_venv(self, python_bin, venv):
+        for name in ('bin', 'lib/python2.7/site-packages'):
+            os.makedirs(os.path.join(venv, name))
+        with open(os.path.join(venv, 'bin', 'pip'), 'w') as f:
+            f.write('#!%s/bin/python\n' % venv)
+        os.chmod(os.path.join(venv, 'bin', 'pip'), 0755)
+        with open(os.path.join(venv, 'bin', 'python'), 'wb') as f:
+            f.write('\x7fELF\0%s' % venv)
+        site_packages = os.path.join(venv, 'lib/python2.7/site-packages')
+        with open(os.path.join(site_packages, 'app.egg-link'), 'w') as f:
+            f.write('%s/src/app\n.' % venv)
+        with open(os.path.join(site_packages, 'mysql.py'), 'w') as f:
+            f.write('# %s\n' % venv)
+        with open(os.path.join(site_packages, '_mysql.so'), 'wb') as f:
+            f.write('\x7fELF\0')
+        with open(os.path.join(site_packages, 'easy-install.pth'), 'w') as f:
+            f.write('./vendor\n')
+        os.symlink(os.path.join(venv, 'lib'), os.path.join(venv, 'lib64'))
+        os.symlink('/usr/lib/python2.7/os.py',
+                   os.path.join(venv, 'lib/python2.7/os.py'))
+
+    @patch('funfactory.cmd.install_reqs')
+    @patch('funfactory.cmd.run_virtualenv')
+    def test_template(self, run_virtualenv, install_reqs):
+        run_virtualenv.side_effect = self.make_venv
+        template = venv_template(self.templates, sys.executable, self.dir)
+        eq_(os.listdir(self.templates), [os.path.basename(template)])
+        eq_(venv_template(self.templates, sys.executable, self.dir),
+            template)
+        eq_(run_virtualenv.call_count, 1)
+        eq_(install_reqs.call_count, 1)
+
+        venv = os.path.join(self.dir, 'app', '.virtualenv')
+        clone_virtualenv(template, venv)
+        with open(os.path.join(venv, 'bin', 'pip')) as f:
+            eq_(f.read(), '#!%s/bin/python\n' % venv)
+        ok_(os.access(os.path.join(venv, 'bin', 'pip'), os.X_OK))
+        site_packages = os.path.join(venv, 'lib/python2.7/site-packages')
+        with open(os.path.join(site_packages, 'app.egg-link')) as f:
+            eq_(f.read(), '%s/src/app\n.' % venv)
+        for name in ('bin/python', 'lib/python2.7/site-packages/_mysql.so'):
+            eq_(os.stat(os.path.join(template, name)).st_ino,
+                os.stat(os.path.join(venv, name)).st_ino)
+        for name in ('bin/pip', 'lib/python2.7/site-packages/mysql.py'):
+            ok_(os.stat(os.path.join(template, name)).st_ino !=
+                os.stat(os.path.join(venv, name)).st_ino)
+        # setuptools rewrites easy-install.pth in place.
+        with open(os.path.join(site_packages, 'easy-install.pth'), 'w') as f:
+            f.write('./vendor\n./src/app\n')
+        with open(os.path.join(template, 'lib/python2.7/site-packages',
+                               'easy-install.pth')) as f:
+            eq_(f.read(), './vendor\n')
+        eq_(os.readlink(os.path.join(venv, 'lib64')),
+            os.path.join(venv, 'lib'))
+        eq_(os.readlink(os.path.join(venv, 'lib/python2.7/os.py')),
+            '/usr/lib/python2.7/os.py')
+        ok_(not os.path.exists(os.path.join(venv, TEMPLATE_MARKER)))
+        eq_(os.listdir(os.path.dirname(venv)), ['.virtualenv'])
+
+    @patch('funfactory.cmd.install_reqs')
+    @patch('funfactory.cmd.run_virtualenv')
+    def test_interrupted_clone(self, run_virtualenv, install_reqs):
+        run_virtualenv.side_effect = self.make_venv
+        template = venv_template(self.templates, sys.executable, self.dir)
+        venv = os.path.join(self.dir, 'app', '.virtualenv')
+        with patch('funfactory.cmd._clone_file', side_effect=IOError):
+            try:
+                clone_virtualenv(template, venv)
+            except IOError:
+                pass
+            else:
+                raise AssertionError('IOError not raised')
+        eq_(os.listdir(os.path.dirname(venv)), [])
+        clone_virtualenv(template, venv)
+        ok_(os.path.exists(os.path.join(venv, 'bin', 'python')))
+
+
+class TestCreateSettings(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.settings = os.path.join(self.dir, 'app', 'settings')
+        os.makedirs(self.settings)
+        with open(os.path.join(self.settings, 'local.py-dist'), 'w') as f:
+            f.write("SECRET_KEY = ''\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    @patch('funfactory.cmd._patch_settings', side_effect=RuntimeError)
+    def test_failed_patch(self, _patch_settings):
+        self.assertRaises(RuntimeError, create_settings, 'app', self.dir,
+                          'root', 'app', None, None, None)
+        eq_(os.listdir(self.settings), ['local.py-dist'])
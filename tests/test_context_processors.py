@@ -1,7 +1,8 @@
 import jingo
 import jinja2
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 
 from mock import patch
 
@@ -35,3 +36,22 @@ class TestContext(TestCase):
 
     def test_lang_dir(self):
         eq_(self.render("{{ DIR }}"), 'ltr')
+
+    @override_settings(LANGUAGE_URL_MAP={'ar': 'ar', 'en-us': 'en-US'})
+    @patch.object(funfactory.context_processors, 'translation')
+    def test_i18n_cached(self, translation):
+        translation.get_language.return_value = 'ar'
+        request = self.factory.get('/')
+        i18n = funfactory.context_processors.i18n
+        eq_(i18n(request)['DIR'], 'rtl')
+        i18n(request)['DIR'] = 'ltr'
+        eq_(i18n(request)['DIR'], 'rtl')
+        with patch.object(funfactory.context_processors, 'settings') as st:
+            eq_(i18n(request)['LANG'], 'ar')
+        ok_(not st.mock_calls)
+
+    @override_settings(LANGUAGE_URL_MAP={'ar': 'ar', 'en-us': 'en-US'})
+    def test_warm_i18n(self):
+        funfactory.context_processors.warm_i18n()
+        eq_(sorted(funfactory.context_processors._i18n_contexts),
+            ['ar', 'en-US'])
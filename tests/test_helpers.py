@@ -2,6 +2,8 @@ from nose.tools import eq_, ok_
 from django.test import TestCase
 import jingo
 
+from funfactory.helpers import urlparams
+
 
 def render(s, context={}):
     t = jingo.env.from_string(s)
@@ -17,3 +19,21 @@ class HelpersTests(TestCase):
         # non-ascii
         context = {'key': u'\xe4'}
         eq_(render(template, context), '<a href="?var=%C3%A4">')
+
+
+class UrlparamsTests(TestCase):
+
+    def test_plain_path(self):
+        eq_(urlparams('/foo/', page=2), '/foo/?page=2')
+        eq_(urlparams('/foo/', page=None), '/foo/')
+        eq_(urlparams('/foo/', hash='top', q=u'\xe4'), '/foo/?q=%C3%A4#top')
+
+    def test_merge_query(self):
+        eq_(urlparams('/foo/?a=1#bar', a=2), '/foo/?a=2#bar')
+        eq_(urlparams('/foo/?a=1#bar', a=None, hash=''), '/foo/')
+        # The cached parse of the base URL must not pick up earlier params.
+        eq_(urlparams('/foo/?a=1#bar', b=3), '/foo/?a=1&b=3#bar')
+
+    def test_absolute_url(self):
+        eq_(urlparams('http://example.com/foo/', page=2),
+            'http://example.com/foo/?page=2')
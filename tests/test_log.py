@@ -0,0 +1,153 @@
+import logging
+import sys
+import threading
+
+from django.test import RequestFactory, TestCase
+from django.test.utils import override_settings
+
+from mock import patch
+from nose.tools import eq_, ok_
+
+from funfactory.log import (AreciboHandler, log_cef, LogQueue, QueueHandler,
+                            queue_handlers, queue_stats)
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def emit(self, record):
+        self.unblocked.wait()
+        self.records.append(record)
+
+
+def test_log_queue():
+    target = ListHandler()
+    queue = LogQueue('test', maxsize=10)
+    handler = QueueHandler(target, queue)
+    logger = logging.getLogger('funfactory.test_log_queue')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for i in range(5):
+            logger.error('record %s', i)
+        handler.flush()
+        eq_([r.getMessage() for r in target.records],
+            ['record %s' % i for i in range(5)])
+        eq_(queue_stats()['test'], {'queued': 0, 'dropped': 0, 'maxsize': 10})
+    finally:
+        logger.removeHandler(handler)
+
+
+class NullHandler(logging.Handler):
+
+    def emit(self, record):
+        pass
+
+
+def test_queue_handlers():
+    shared, own = ListHandler(), NullHandler()
+    a = logging.getLogger('funfactory.test_a')
+    b = logging.getLogger('funfactory.test_b')
+    a.handlers, b.handlers = [shared], [shared, own]
+    queue = LogQueue('test_shared')
+    try:
+        queue_handlers(['funfactory.test_a', 'funfactory.test_b'], queue,
+                       exclude=[NullHandler])
+        ok_(isinstance(a.handlers[0], QueueHandler))
+        ok_(a.handlers[0] is b.handlers[0])
+        ok_(b.handlers[1] is own)
+        a.error('a')
+        b.error('b')
+        queue.flush()
+        eq_([r.getMessage() for r in shared.records], ['a', 'b'])
+    finally:
+        a.handlers, b.handlers = [], []
+
+
+def test_log_queue_drops_when_full():
+    target = ListHandler()
+    target.unblocked.clear()  # A stuck syslog.
+    queue = LogQueue('test_full', maxsize=1)
+    for i in range(3):
+        queue.put(target, logging.makeLogRecord({'msg': i}))
+    ok_(queue.dropped >= 1)
+    target.unblocked.set()
+    queue.flush()
+    eq_(len(target.records) + queue.dropped, 3)
+
+
+def test_log_queue_flush_timeout():
+    target = ListHandler()
+    target.unblocked.clear()
+    queue = LogQueue('test_stuck', batch_size=1, flush_timeout=0.1)
+    for i in range(3):
+        queue.put(target, logging.makeLogRecord({'msg': i}))
+    queue.flush()
+    # The thread is stuck on one record; the others are dropped.
+    eq_(queue.stats(), {'queued': 0, 'dropped': 2, 'maxsize': 10000})
+    target.unblocked.set()
+    queue.flush()
+    eq_(len(target.records), 1)
+
+
+@patch('commonware.log.getLogger')
+def test_log_cef(getLogger):
+    request = RequestFactory().get('/', HTTP_USER_AGENT='Firefox',
+                                   HTTP_COOKIE='secret')
+    log_cef('Login', 5, request, username='bob', extra='data')
+    severity, name, c = getLogger.return_value.log.call_args[0]
+    eq_((severity, name, c['username'], c['data'], c['product']),
+        (5, 'Login', 'bob', {'extra': 'data'}, 'Playdoh'))
+    # Only what the cef library reads is copied.
+    eq_(sorted(c['environ']), ['HTTP_USER_AGENT', 'PATH_INFO', 'REMOTE_ADDR',
+                               'REQUEST_METHOD'])
+
+
+def error_record(request):
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        return logging.makeLogRecord({'request': request,
+                                      'exc_info': sys.exc_info()})
+
+
+@override_settings(ARECIBO_SERVER_URL='http://arecibo.example.com')
+class TestAreciboHandler(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.posted = []
+
+    def post(self, request, status, **kwargs):
+        # post() reports the exception being handled.
+        self.posted.append((request, sys.exc_info()[1], kwargs))
+
+    def test_workers(self):
+        handler = AreciboHandler(workers=2)
+        handler._post = self.post
+        handler.handle(error_record(self.request))
+        handler.queue.flush()
+        eq_(len(self.posted), 1)
+        request, exc, kwargs = self.posted[0]
+        eq_((request, str(exc), kwargs), (self.request, 'boom', {}))
+
+    @patch('funfactory.log.threading.Timer')
+    def test_dedupe(self, Timer):
+        handler = AreciboHandler(dedupe_window=60)
+        handler._post = self.post
+        for i in range(4):
+            handler.handle(error_record(self.request))
+        eq_(len(self.posted), 1)
+        # Close the window instead of waiting for its timer.
+        (key, window), = handler._windows.items()
+        eq_(Timer.call_args[0][2], [key, window])
+        handler._close_window(key, window)
+        eq_(len(self.posted), 2)
+        eq_(self.posted[1][2], {'count': 3})
+        handler.handle(error_record(self.request))
+        eq_(len(self.posted), 3)
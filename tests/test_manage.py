@@ -1,10 +1,16 @@
+import __builtin__
+import os
+import shutil
 import smtplib
+import sys
+import tempfile
 import xml.dom
 import unittest
 
-from nose.tools import eq_, raises
+from nose.tools import eq_, ok_, raises
 
-from funfactory.manage import import_mod_by_name
+from funfactory.manage import (import_mod_by_name, prepend_sys_path,
+                               site_dir_entries, StartupProfiler)
 
 
 class TestImporter(unittest.TestCase):
@@ -25,3 +31,132 @@ class TestImporter(unittest.TestCase):
     @raises(ImportError)
     def test_unknown_mod(self):
         import_mod_by_name('notthenameofamodule')
+
+
+class TestStartupProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(os.path.join(self.dir, 'ff_profiled.py'), 'w') as f:
+            f.write('import ff_profiled_child\n')
+        open(os.path.join(self.dir, 'ff_profiled_child.py'), 'w').close()
+        pkg = os.path.join(self.dir, 'ff_profiled_pkg')
+        os.mkdir(pkg)
+        with open(os.path.join(pkg, '__init__.py'), 'w') as f:
+            f.write('from . import settings\n')
+        with open(os.path.join(pkg, 'settings.py'), 'w') as f:
+            f.write('from . import base\n')
+        open(os.path.join(pkg, 'base.py'), 'w').close()
+        sys.path.insert(0, self.dir)
+
+    def tearDown(self):
+        sys.path.remove(self.dir)
+        for mod in list(sys.modules):
+            if mod.startswith('ff_profiled'):
+                del sys.modules[mod]
+        shutil.rmtree(self.dir)
+
+    def test_report(self):
+        original_import = __builtin__.__import__
+        profiler = StartupProfiler()
+        profiler.start()
+        try:
+            with profiler.phase('settings'):
+                import_mod_by_name('ff_profiled')
+                import_mod_by_name('smtplib')
+        finally:
+            profiler.stop()
+        eq_(__builtin__.__import__, original_import)
+        eq_([name for name, t in profiler.phases], ['settings'])
+        eq_(sorted(profiler.imports), ['ff_profiled', 'ff_profiled_child'])
+        cum, own = profiler.imports['ff_profiled']
+        ok_(cum >= own)
+        report = profiler.report()
+        ok_('settings' in report)
+        ok_(report.index('ff_profiled\n') < report.index('ff_profiled_child'))
+
+    def test_relative_imports(self):
+        profiler = StartupProfiler()
+        profiler.start()
+        try:
+            import_mod_by_name('ff_profiled_pkg')
+        finally:
+            profiler.stop()
+        eq_(sorted(profiler.imports), ['ff_profiled_pkg',
+                                       'ff_profiled_pkg.base',
+                                       'ff_profiled_pkg.settings'])
+        ok_(profiler.imports['ff_profiled_pkg'][0] >=
+            profiler.imports['ff_profiled_pkg.settings'][0] >=
+            profiler.imports['ff_profiled_pkg.base'][0])
+
+    def test_loaded(self):
+        profiler = StartupProfiler()
+        ok_(profiler._loaded('os', {}, None, -1))
+        ok_(profiler._loaded('os', {'__name__': '__main__'}, [], 0))
+        ok_(not profiler._loaded('ff_profiled', {}, None, -1))
+        ok_(not profiler._loaded('os', {}, ['path'], -1))
+        ok_(not profiler._loaded('os', {}, None, 1))
+        # Could still load ff_profiled_pkg/os.py.
+        ok_(not profiler._loaded('os', {'__name__': 'ff_profiled_pkg.base'},
+                                 None, -1))
+        ok_(not profiler._loaded('os', {'__name__': 'ff_profiled_pkg',
+                                        '__path__': []}, None, -1))
+        sys.modules['ff_profiled_pkg.os'] = None
+        ok_(profiler._loaded('os', {'__name__': 'ff_profiled_pkg.base'},
+                             None, -1))
+
+
+class TestSysPath(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.vendor = os.path.join(self.dir, 'vendor')
+        for name in ('vendor/src/a', 'vendor/src/b', 'vendor/lib/python'):
+            os.makedirs(os.path.join(self.dir, name))
+        with open(os.path.join(self.vendor, 'vendor.pth'), 'w') as f:
+            f.write('# comment\nsrc/a\nsrc/b\nsrc/a\nsrc/missing\n'
+                    'import os\n')
+        self.sys_path = sys.path[:]
+
+    def tearDown(self):
+        sys.path[:] = self.sys_path
+        shutil.rmtree(self.dir)
+
+    def test_site_dir_entries(self):
+        paths, imports = site_dir_entries([
+            self.vendor, os.path.join(self.vendor, 'lib/python'),
+            os.path.join(self.dir, 'vendor-local')])
+        eq_(paths, [self.vendor,
+                    os.path.join(self.vendor, 'src/a'),
+                    os.path.join(self.vendor, 'src/b'),
+                    os.path.join(self.vendor, 'src/a'),
+                    os.path.join(self.vendor, 'lib/python')])
+        eq_(imports, ['import os\n'])
+
+    def test_cache(self):
+        cache_file = os.path.join(self.dir, 'sys_path.json')
+        os.utime(self.vendor, (1000, 1000))
+        expected = site_dir_entries([self.vendor], cache_file)
+        ok_(os.path.exists(cache_file))
+        os.remove(os.path.join(self.vendor, 'vendor.pth'))
+        os.utime(self.vendor, (1000, 1000))
+        eq_(site_dir_entries([self.vendor], cache_file), expected)
+        os.utime(self.vendor, (0, 0))
+        eq_(site_dir_entries([self.vendor], cache_file), ([self.vendor], []))
+
+    def test_prepend_sys_path(self):
+        existing = sys.path[-1]
+        prepend_sys_path([self.vendor, existing, self.dir, self.vendor])
+        eq_(sys.path[:2], [self.vendor, self.dir])
+        eq_(sys.path.count(self.vendor), 1)
+        eq_(sys.path.count(existing), 1)
+
+    def test_prepend_cwd(self):
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            sys.path.insert(0, '')
+            prepend_sys_path([self.dir])
+            eq_(sys.path[:2], [self.dir, ''])
+        finally:
+            os.chdir(cwd)
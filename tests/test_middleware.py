@@ -1,7 +1,24 @@
 from django.test import TestCase, RequestFactory
 from django.test.utils import override_settings
 
-from funfactory.middleware import LocaleURLMiddleware
+from mock import patch
+from nose.tools import eq_
+
+from funfactory import middleware, urlresolvers
+from funfactory.middleware import LocaleURLMiddleware, PathPrefixTrie
+
+
+def test_path_prefix_trie():
+    trie = PathPrefixTrie(['static', '/media/', 'api/v1', ''])
+    eq_(trie.match('/static/css/site.css'), True)
+    eq_(trie.match('/static'), True)
+    eq_(trie.match('/media/'), True)
+    eq_(trie.match('/api/v1/items/'), True)
+    eq_(trie.match('/api/v2/items/'), False)
+    eq_(trie.match('/api'), False)
+    eq_(trie.match('/staticfiles/'), False)
+    eq_(trie.match('/en-US/static/'), False)
+    eq_(trie.match('/'), False)
 
 
 class TestLocaleURLMiddleware(TestCase):
@@ -37,6 +54,19 @@ class TestLocaleURLMiddleware(TestCase):
         resp = LocaleURLMiddleware().process_request(req)
         self.assertEqual(resp['Location'], '/de/the/dude/')
 
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       FF_EXEMPT_LANG_PARAM_URLS=())
+    def test_lang_param_vary(self):
+        """Redirects for an unsupported lang depend on Accept-Language."""
+        req = self.rf.get('/about/', {'lang': 'de'}, HTTP_ACCEPT_LANGUAGE='fr')
+        resp = self.middleware.process_request(req)
+        eq_(resp['Location'], '/de/about/')
+        assert not resp.has_header('Vary')
+        req = self.rf.get('/about/', {'lang': 'xx'}, HTTP_ACCEPT_LANGUAGE='fr')
+        resp = self.middleware.process_request(req)
+        eq_(resp['Location'], '/fr/about/')
+        eq_(resp['Vary'], 'Accept-Language')
+
     @override_settings(DEV_LANGUAGES=('de', 'fr'),
                        FF_EXEMPT_LANG_PARAM_URLS=('/dude/',))
     def test_no_redirect_lang_param(self):
@@ -45,3 +75,93 @@ class TestLocaleURLMiddleware(TestCase):
         req = self.rf.get(path, {'lang': 'de'})
         resp = LocaleURLMiddleware().process_request(req)
         self.assertIs(resp, None)  # no redirect
+
+    @override_settings(SUPPORTED_NONLOCALES=['static'])
+    @patch.object(urlresolvers, 'split_path')
+    @patch.object(urlresolvers.Prefixer, 'get_language')
+    def test_nonlocale_bypass(self, get_language, split_path):
+        """Non-locale paths should skip locale detection entirely."""
+        urlresolvers.set_url_prefix('stale')
+        req = self.rf.get('/static/site.css', HTTP_ACCEPT_LANGUAGE='de')
+        resp = LocaleURLMiddleware().process_request(req)
+        self.assertIs(resp, None)
+        eq_(req.locale, '')
+        eq_(req.path_info, '/static/site.css')
+        eq_(urlresolvers.get_url_prefix().request, req)
+        assert not split_path.called
+        assert not get_language.called
+
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       SUPPORTED_NONLOCALES=['admin'])
+    def test_nonlocale_reverse(self):
+        """URLs reversed under non-locale paths should still get a locale."""
+        req = self.rf.get('/admin/', HTTP_ACCEPT_LANGUAGE='de')
+        self.assertIs(self.middleware.process_request(req), None)
+        try:
+            eq_(urlresolvers.reverse('test.view',
+                                     urlconf='tests.test_urlresolvers'),
+                '/de/test/')
+        finally:
+            self.middleware.process_response(req, None)
+
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       FF_EXEMPT_LOCALE_PREFIXES=('healthz',))
+    def test_exempt_prefixes(self):
+        """FF_EXEMPT_LOCALE_PREFIXES should replace SUPPORTED_NONLOCALES."""
+        req = self.rf.get('/healthz', HTTP_ACCEPT_LANGUAGE='de')
+        self.assertIs(LocaleURLMiddleware().process_request(req), None)
+        req = self.rf.get('/about/', HTTP_ACCEPT_LANGUAGE='de')
+        resp = LocaleURLMiddleware().process_request(req)
+        self.assertEqual(resp['Location'], '/de/about/')
+
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       FF_LOCALE_REDIRECT_CACHE_SIZE=10)
+    def test_redirect_cache(self):
+        """Bare URLs should be redirected from the cache the second time."""
+        for i in range(2):
+            req = self.rf.get('/about/', {'q': 'x'}, HTTP_ACCEPT_LANGUAGE='de')
+            with patch.object(urlresolvers.Prefixer, 'fix',
+                              wraps=urlresolvers.Prefixer(req).fix) as fix:
+                resp = self.middleware.process_request(req)
+            eq_(resp['Location'], '/de/about/?q=x')
+            eq_(resp['Vary'], 'Accept-Language')
+        assert not fix.called
+        eq_(middleware.redirect_cache_info()['hits'], 1)
+        req = self.rf.get('/about/', HTTP_ACCEPT_LANGUAGE='fr')
+        eq_(self.middleware.process_request(req)['Location'], '/fr/about/')
+
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       FF_LOCALE_REDIRECT_CACHE_CONTROL={'public': True,
+                                                         'max_age': 3600},
+                       FF_LOCALE_VARY_HEADER='X-Language-Group')
+    def test_edge_cacheable_redirect(self):
+        """Redirects should be cacheable and vary on the configured header."""
+        req = self.rf.get('/about/', HTTP_ACCEPT_LANGUAGE='de',
+                          HTTP_X_LANGUAGE_GROUP='fr')
+        resp = self.middleware.process_request(req)
+        eq_(resp['Location'], '/fr/about/')
+        eq_(resp['Vary'], 'X-Language-Group')
+        eq_(sorted(resp['Cache-Control'].split(', ')),
+            ['max-age=3600', 'public'])
+
+    @override_settings(DEV_LANGUAGES=('de', 'fr'),
+                       FF_LOCALE_REDIRECT_CACHE_SIZE=10)
+    def test_redirect_vary_script_name(self):
+        """Redirects under a script prefix should vary too."""
+        for lang in ('de', 'fr'):
+            req = self.rf.get('/about/', SCRIPT_NAME='/app',
+                              HTTP_ACCEPT_LANGUAGE=lang)
+            resp = self.middleware.process_request(req)
+            eq_(resp['Location'], '/app/%s/about/' % lang)
+            eq_(resp['Vary'], 'Accept-Language')
+        req = self.rf.get('/de/about/', SCRIPT_NAME='/app')
+        self.assertIs(self.middleware.process_request(req), None)
+
+    def test_prefix_reset_on_response(self):
+        """The URL prefix should not outlive the request."""
+        req = self.rf.get('/en-US/the/dude/')
+        middleware = LocaleURLMiddleware()
+        middleware.process_request(req)
+        assert urlresolvers.get_url_prefix()
+        eq_(middleware.process_response(req, 'response'), 'response')
+        eq_(urlresolvers.get_url_prefix(), None)
@@ -1,12 +1,18 @@
+import os
+import shutil
+import tempfile
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 from mock import Mock, patch
-from nose.tools import eq_, raises
+from nose.tools import eq_, ok_, raises
 
 from funfactory.manage import validate_settings
-from funfactory.settings_base import (get_apps, get_middleware,
-    get_template_context_processors)
+from django.test.utils import override_settings
+from funfactory.settings_base import (discover_dev_languages, get_apps,
+    get_middleware, get_template_context_processors, lazy_dev_languages,
+    ResolvedMapping)
 
 
 @patch.object(settings, 'DEBUG', True)
@@ -101,3 +107,58 @@ def test_get_processors():
         ('porthos', "d'artagnan", 'aramis'))
     eq_(get_template_context_processors(append=['richelieu']),
         get_template_context_processors())
+
+
+def test_discover_dev_languages():
+    root = tempfile.mkdtemp()
+    try:
+        locale = os.path.join(root, 'locale')
+        for loc in ('fr', 'en_US', 'templates'):
+            os.makedirs(os.path.join(locale, loc, 'LC_MESSAGES'))
+        open(os.path.join(locale, 'empty_file'), 'w').close()
+        manifest = os.path.join(root, 'manifest.json')
+        os.utime(locale, (1000, 1000))
+        dirs = [locale, os.path.join(root, 'missing')]
+        eq_(discover_dev_languages(dirs, manifest), ['en-US', 'fr'])
+        ok_(os.path.exists(manifest))
+
+        # Unchanged dirs are not listed again.
+        with patch('os.listdir') as listdir:
+            eq_(discover_dev_languages(dirs, manifest), ['en-US', 'fr'])
+        ok_(not listdir.called)
+
+        os.mkdir(os.path.join(locale, 'de'))
+        eq_(discover_dev_languages(dirs, manifest), ['de', 'en-US', 'fr'])
+    finally:
+        shutil.rmtree(root)
+
+
+@patch('funfactory.settings_base._resolved_dev_languages', [])
+def test_dev_languages_resolved_once():
+    root = tempfile.mkdtemp()
+    try:
+        manifest = os.path.join(root, 'manifest.json')
+        with patch('glob.glob', return_value=[]) as glob:
+            with override_settings(DEV_LANGUAGES_MANIFEST=manifest):
+                langs = lazy_dev_languages()
+                ok_(lazy_dev_languages() is langs)
+        eq_(glob.call_count, 1)
+        ok_(langs)
+        eq_(os.listdir(root), ['manifest.json'])
+    finally:
+        shutil.rmtree(root)
+
+
+def test_resolved_mapping():
+    func = Mock(side_effect=lambda: {'en-us': settings.DEBUG})
+    mapping = ResolvedMapping(func, ('DEBUG',))
+    ok_(not func.called)
+    eq_(mapping.get('en-us'), settings.DEBUG)
+    ok_('en-us' in mapping)
+    eq_(mapping, {'en-us': settings.DEBUG})
+    eq_(dict(mapping), {'en-us': settings.DEBUG})
+    eq_(func.call_count, 1)
+    with override_settings(DEBUG=not settings.DEBUG):
+        eq_(mapping['en-us'], settings.DEBUG)
+    eq_(mapping['en-us'], settings.DEBUG)
+    eq_(func.call_count, 3)
@@ -0,0 +1,73 @@
+import gzip
+import os
+import shutil
+import tempfile
+from xml.dom import minidom
+
+from django.conf.urls.defaults import patterns, url
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_
+
+from funfactory.sitemaps import locale_urls, SitemapWriter
+from funfactory.urlresolvers import get_url_prefix, reverse, set_url_prefix
+
+
+urlpatterns = patterns('',
+    url(r'^items/(\d+)/$', lambda r: None, name='test.item'),
+)
+
+
+def locs(path, opener=open):
+    f = opener(path)
+    try:
+        return [node.firstChild.data for node in
+                minidom.parse(f).getElementsByTagName('loc')]
+    finally:
+        f.close()
+
+
+@override_settings(SITE_URL='http://example.com',
+                   LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'})
+class SitemapTests(TestCase):
+    urls = 'tests.test_sitemaps'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        set_url_prefix(None)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_locale_urls(self):
+        def views():
+            for i in range(3):
+                yield 'test.item', (i,), {}
+                # The locale prefix is not left in place between batches.
+                eq_(get_url_prefix(), None)
+
+        eq_(list(locale_urls(views, batch_size=2)),
+            ['http://example.com/de/items/%s/' % i for i in range(3)] +
+            ['http://example.com/en-US/items/%s/' % i for i in range(3)])
+
+    def test_writer(self):
+        with SitemapWriter(self.dir, max_urls=2) as sitemap:
+            sitemap.extend('http://example.com/%s/?a=1&b=2' % i
+                           for i in range(3))
+        eq_(sorted(os.listdir(self.dir)),
+            ['sitemap-1.xml', 'sitemap-2.xml', 'sitemap.xml'])
+        eq_(locs(os.path.join(self.dir, 'sitemap.xml')),
+            ['http://example.com/sitemap-1.xml',
+             'http://example.com/sitemap-2.xml'])
+        eq_(locs(os.path.join(self.dir, 'sitemap-2.xml')),
+            ['http://example.com/2/?a=1&b=2'])
+
+    def test_gzip(self):
+        sitemap = SitemapWriter(self.dir, base_url='/', gzip=True)
+        sitemap.add(reverse('test.item', args=[1]), priority=0.5)
+        eq_(sitemap.close(), os.path.join(self.dir, 'sitemap.xml.gz'))
+        eq_(locs(os.path.join(self.dir, 'sitemap.xml.gz'), gzip.open),
+            ['/sitemap-1.xml.gz'])
+        eq_(locs(os.path.join(self.dir, 'sitemap-1.xml.gz'), gzip.open),
+            ['/items/1/'])
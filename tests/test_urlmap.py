@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+
+from django.conf.urls.defaults import patterns, url
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_
+
+from funfactory.management.commands.prerender_urls import parse_view
+from funfactory.urlmap import render_urls, URLMap
+from funfactory.urlresolvers import locale_prefixer, url_prefix
+
+
+urlpatterns = patterns('',
+    url(r'^$', lambda r: None, name='test.home'),
+    url(r'^items/(?P<pk>\d+)/$', lambda r: None, name='test.item'),
+)
+
+VIEWS = [('test.home', [], {})] + [('test.item', [], {'pk': str(pk)})
+                                   for pk in range(5)]
+
+
+@override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'},
+                   PROD_LANGUAGES=('en-US', 'de'))
+class URLMapTests(TestCase):
+    urls = 'tests.test_urlmap'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_view(self):
+        eq_(parse_view('test.home'), ('test.home', [], {}))
+        eq_(parse_view('test.item:1,pk=2'), ('test.item', ['1'], {'pk': '2'}))
+
+    def test_render_urls(self):
+        in_process = render_urls(VIEWS, ['de', 'en-US'], processes=1,
+                                 chunk_size=2)
+        eq_(render_urls(VIEWS, ['de', 'en-US'], processes=2, chunk_size=2),
+            in_process)
+        urls = URLMap(in_process)
+        eq_(urls.get('test.item', kwargs={'pk': '3'}, locale='de'),
+            '/de/items/3/')
+        eq_(urls.get('test.item', kwargs={'pk': '9'}, locale='de'), None)
+        with url_prefix(locale_prefixer('en-US')):
+            eq_(urls.get('test.home'), '/en-US/')
+
+    def test_command(self):
+        output = os.path.join(self.dir, 'urls.json.gz')
+        call_command('prerender_urls', 'test.home', 'test.item:pk=4',
+                     output=output, processes=1)
+        urls = URLMap.load(output)
+        eq_(urls.locales, ['en-US', 'de'])
+        eq_(urls.get('test.item', kwargs={'pk': '4'}, locale='de'),
+            '/de/items/4/')
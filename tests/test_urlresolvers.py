@@ -1,13 +1,21 @@
 # -*- coding: utf-8 -*-
+import sys
+
 from django.conf import settings
 from django.conf.urls.defaults import patterns, url
 from django.test import TestCase
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
-from funfactory.urlresolvers import reverse, split_path, Prefixer
+from django.core.exceptions import ImproperlyConfigured
+
+from funfactory.urlresolvers import (best_language_cache_info,
+                                     find_supported, get_url_prefix, reverse,
+                                     set_url_prefix, split_path,
+                                     GreenletPrefixStorage, Prefixer,
+                                     ThreadLocalPrefixStorage)
 from mock import patch, Mock
-from nose.tools import eq_, ok_
+from nose.tools import eq_, ok_, raises
 
 
 # split_path tests use a test generator, which cannot be used inside of a
@@ -33,6 +41,73 @@ def check_split_path(path, result):
     eq_(res, result)
 
 
+class TestLocaleIndex(TestCase):
+
+    @override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'pt-br': 'pt-BR'})
+    def test_prefix_match(self):
+        eq_(split_path('/pt/some/action'), ('pt-BR', 'some/action'))
+        eq_(split_path('/PT-pt/some/action'), ('pt-BR', 'some/action'))
+        eq_(find_supported('pt-PT'), ['pt-BR'])
+        eq_(find_supported('de'), [])
+
+    def test_rebuilt_on_setting_changed(self):
+        with override_settings(LANGUAGE_URL_MAP={'de': 'de'}):
+            eq_(split_path('/de/some/action'), ('de', 'some/action'))
+        with override_settings(LANGUAGE_URL_MAP={'fr': 'fr'}):
+            eq_(split_path('/de/some/action'), ('', 'de/some/action'))
+
+
+class DictPrefixStorage(object):
+    prefixes = {}
+
+    def get(self):
+        return self.prefixes.get('prefix')
+
+    def set(self, prefix):
+        self.prefixes['prefix'] = prefix
+
+
+class TestPrefixStorage(TestCase):
+
+    def test_thread_local(self):
+        storage = ThreadLocalPrefixStorage()
+        eq_(storage.get(), None)
+        storage.set('prefixer')
+        eq_(storage.get(), 'prefixer')
+
+    def test_greenlet(self):
+        class Greenlet(object):
+            pass
+
+        greenlets = [Greenlet(), Greenlet()]
+        greenlet = Mock(getcurrent=lambda: greenlets[0])
+        with patch.dict(sys.modules, greenlet=greenlet):
+            storage = GreenletPrefixStorage()
+        storage.set('prefixer')
+        eq_(storage.get(), 'prefixer')
+        greenlets.reverse()
+        eq_(storage.get(), None)
+        storage.set('other')
+        greenlets.reverse()
+        eq_(storage.get(), 'prefixer')
+        storage.set(None)
+        eq_(storage.get(), None)
+        eq_(len(storage._prefixes), 1)
+
+    @override_settings(
+        FF_URL_PREFIX_STORAGE='tests.test_urlresolvers.DictPrefixStorage')
+    def test_configured_storage(self):
+        set_url_prefix('prefixer')
+        eq_(DictPrefixStorage.prefixes, {'prefix': 'prefixer'})
+        eq_(get_url_prefix(), 'prefixer')
+        set_url_prefix(None)
+
+    @raises(ImproperlyConfigured)
+    @override_settings(FF_URL_PREFIX_STORAGE='tests.NoSuchStorage')
+    def test_bad_storage(self):
+        get_url_prefix()
+
+
 # Test urlpatterns
 urlpatterns = patterns('',
     url(r'^test/$', lambda r: None, name='test.view')
@@ -59,6 +134,30 @@ class TestReverse(TestCase):
         self.assertEqual(type(result), str)
 
 
+@override_settings(FF_REVERSE_CACHE_SIZE=10)
+@patch('funfactory.urlresolvers.get_url_prefix')
+class TestCachedReverse(TestCase):
+    urls = 'tests.test_urlresolvers'
+
+    def setUp(self):
+        self.request = RequestFactory().get('/en-US/')
+
+    @patch('funfactory.urlresolvers.django_reverse')
+    def test_memoized(self, django_reverse, get_url_prefix):
+        django_reverse.return_value = '/test/'
+        get_url_prefix.return_value = Prefixer(self.request)
+        eq_(reverse('test.view'), '/en-US/test/')
+        eq_(reverse('test.view'), '/en-US/test/')
+        eq_(django_reverse.call_count, 1)
+
+    @override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'})
+    def test_keyed_on_locale(self, get_url_prefix):
+        get_url_prefix.return_value = Prefixer(self.request)
+        eq_(reverse('test.view'), '/en-US/test/')
+        get_url_prefix.return_value = Prefixer(RequestFactory().get('/de/'))
+        eq_(reverse('test.view'), '/de/test/')
+
+
 class TestPrefixer(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
@@ -124,6 +223,39 @@ class TestPrefixer(TestCase):
         eq_(prefixer.get_language(), 'en-US')
         prefixer.get_best_language.assert_called_once_with('de, es')
 
+    @override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'})
+    def test_get_language_once(self):
+        """
+        Should negotiate the language only once and only when needed
+        """
+        request = self.factory.get('/de/foo', HTTP_ACCEPT_LANGUAGE='de, es')
+        prefixer = Prefixer(request)
+        prefixer.get_best_language = Mock(return_value='de')
+        eq_(prefixer.fix('/bar'), '/de/bar')
+        ok_(not prefixer.get_best_language.called)
+
+        request = self.factory.get('/foo', HTTP_ACCEPT_LANGUAGE='de, es')
+        prefixer = Prefixer(request)
+        prefixer.get_best_language = Mock(return_value='de')
+        eq_(prefixer.fix('/bar'), '/de/bar')
+        eq_(prefixer.fix('/baz'), '/de/baz')
+        prefixer.get_best_language.assert_called_once_with('de, es')
+
+    def test_split_is_lazy(self):
+        """
+        Should split the path it was created with on first use
+        """
+        request = self.factory.get('/en-US/foo')
+        with patch('funfactory.urlresolvers.split_path') as split_path:
+            split_path.return_value = ('en-US', 'foo')
+            prefixer = Prefixer(request)
+            request.path_info = '/foo'
+            ok_(not split_path.called)
+            eq_(prefixer.locale, 'en-US')
+            prefixer.locale = ''
+            eq_(prefixer.shortened_path, 'foo')
+            split_path.assert_called_once_with('/en-US/foo')
+
     @override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'})
     def test_get_best_language_exact_match(self):
         """
@@ -171,3 +303,18 @@ class TestPrefixer(TestCase):
         request = self.factory.get('/')
         prefixer = Prefixer(request)
         eq_(prefixer.get_best_language('en; q=1,'), None)
+
+    @override_settings(LANGUAGE_URL_MAP={'en-us': 'en-US', 'de': 'de'},
+                       FF_ACCEPT_LANGUAGE_CACHE_SIZE=10)
+    @patch('funfactory.urlresolvers.parse_accept_lang_header')
+    def test_get_best_language_cached(self, parse_accept_lang_header):
+        """
+        Should negotiate each distinct Accept-Language value only once
+        """
+        parse_accept_lang_header.return_value = [('de', 1.0)]
+        prefixer = Prefixer(self.factory.get('/'))
+        eq_(prefixer.get_best_language('de, es'), 'de')
+        eq_(prefixer.get_best_language('de, es'), 'de')
+        eq_(parse_accept_lang_header.call_count, 1)
+        info = best_language_cache_info()
+        eq_((info['hits'], info['misses'], info['size']), (1, 1, 1))